@@ -6,6 +6,31 @@ import sys
 import json
 import csv
 import re # Import re module for regular expressions
+import gzip # For decompressing the downloaded feed stream
+import shutil # For streaming copies between file objects
+import hashlib # For deriving feed cache keys
+import time # For expiring stale feed cache entries
+import concurrent.futures # For running the CSV conversions in parallel
+
+# --- Optional: orjson for faster per-line parsing (falls back to the stdlib json module) ---
+try:
+    import orjson # Accepts bytes directly; orjson.JSONDecodeError subclasses json.JSONDecodeError
+    _ORJSON_AVAILABLE = True
+except ImportError:
+    _ORJSON_AVAILABLE = False
+# --- End Optional Import ---
+
+# --- Configuration ---
+# Block size for streaming the feed from curl through gzip to disk. Large blocks keep the
+# number of Python-level read/write calls per GB in the hundreds rather than the hundreds of thousands.
+STREAM_BUFFER_SIZE = 4 * 1024 * 1024
+# Decompressed feeds are cached here so repeat runs against an unchanged feed skip the download.
+FEED_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "spurstuff")
+FEED_CACHE_MAX_AGE_DAYS = 30
+# orjson turns integers wider than 64 bits into floats, so lines holding a run of this many digits
+# (found by masking every byte to '0' or ' ') are parsed by the stdlib json module instead
+JSON_LONG_DIGIT_RUN = b'0' * 19
+JSON_DIGIT_MASK_TABLE = bytes(0x30 if 0x30 <= c <= 0x39 else 0x20 for c in range(256))
 
 # --- Provided Functions from localjsontocsvconversion.py ---
 def flatten_json(json_data, parent_key='', sep='_'):
@@ -16,26 +41,37 @@ def flatten_json(json_data, parent_key='', sep='_'):
       (e.g., 'list_key': 'value1,value2').
     """
     items = []
+    _flatten_into(items, json_data, (parent_key,) if parent_key else (), sep)
+    return dict(items)
+
+def _flatten_into(items, json_data, key_parts, sep):
+    """Appends (flat_key, value) pairs for json_data to items.
+    Key components are carried down as a tuple and only joined into a string when a
+    value is emitted, so deep nesting does not re-copy every parent prefix at each level.
+    """
     for k, v in json_data.items():
-        new_key = parent_key + sep + k if parent_key else k
+        new_key_parts = key_parts + (k,)
         if isinstance(v, dict):
-            items.extend(flatten_json(v, new_key, sep=sep).items())
+            _flatten_into(items, v, new_key_parts, sep)
         elif isinstance(v, list):
-            # Check if all items in the list are simple values (not dictionaries)
-            if all(not isinstance(item, dict) for item in v):
-                # If so, join them into a single comma-separated string
-                items.append((new_key, ','.join(map(str, v))))
+            # Locate the first dictionary in the list; the scan stops as soon as one is found
+            first_dict_index = next((i for i, item in enumerate(v) if isinstance(item, dict)), -1)
+            if first_dict_index == -1:
+                # All items are simple values, so join them into a single comma-separated string
+                items.append((sep.join(new_key_parts), ','.join(map(str, v))))
             else:
-                # If the list contains dictionaries, flatten each dictionary with indexed keys
-                for i, item in enumerate(v):
+                # If the list contains dictionaries, flatten each dictionary with indexed keys.
+                # Items before the first dictionary are known to be simple values.
+                for i in range(first_dict_index):
+                    items.append((sep.join(new_key_parts + (str(i),)), v[i]))
+                for i, item in enumerate(v[first_dict_index:], first_dict_index):
                     if isinstance(item, dict):
-                        items.extend(flatten_json(item, new_key + sep + str(i), sep=sep).items())
+                        _flatten_into(items, item, new_key_parts + (str(i),), sep)
                     else:
                         # For mixed lists, if a simple value appears, still index it
-                        items.append((new_key + sep + str(i), item))
+                        items.append((sep.join(new_key_parts + (str(i),)), item))
         else:
-            items.append((new_key, v))
-    return dict(items)
+            items.append((sep.join(new_key_parts), v))
 
 def write_to_csv(data, output_path):
     """Writes a list of dictionaries to a CSV file, ensuring all fields are included.
@@ -64,6 +100,19 @@ def write_to_csv(data, output_path):
         print(f"Error writing to CSV file: {e}", file=sys.stderr)
         sys.exit(1) # Exit if writing fails
 
+def json_loads(data):
+    """
+    Parses one UTF-8 encoded JSON line exactly as json.loads does, using orjson when installed.
+    Lines orjson rejects (NaN, lone surrogates, malformed input) or would read differently
+    (integers wider than 64 bits) go to the stdlib parser instead.
+    """
+    if _ORJSON_AVAILABLE and JSON_LONG_DIGIT_RUN not in data.translate(JSON_DIGIT_MASK_TABLE):
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(data.decode('utf-8'))
+
 def process_json_to_csv(input_file_path, output_file_path):
     """
     Processes a JSON file (either single object, list of objects, or JSON Lines)
@@ -86,21 +135,21 @@ def process_json_to_csv(input_file_path, output_file_path):
 
         except json.JSONDecodeError as e_full:
             print(f"Attempt 1 (full file JSON) failed: {e_full}. Falling back to line-by-line parsing.", file=sys.stderr)
-            
+
             for line_num, line in enumerate(file_content.splitlines(), 1):
-                line = line.strip()
-                if not line:
+                # Both parsers accept surrounding JSON whitespace, so only blank lines need checking (no stripped copy)
+                if not line or line.isspace():
                     continue
 
                 try:
-                    json_object = json.loads(line)
+                    json_object = json_loads(line.encode('utf-8'))
                     if isinstance(json_object, dict):
                         raw_data.append(json_object)
                     elif isinstance(json_object, list):
                         raw_data.extend(json_object)
                     else:
                         print(f"Warning: Line {line_num} contains valid JSON but is not a dictionary or list (type: {type(json_object)}). Skipping: '{line}'", file=sys.stderr)
-                except json.JSONDecodeError as e_line:
+                except ValueError as e_line: # json.JSONDecodeError, which orjson.JSONDecodeError subclasses
                     print(f"Error decoding malformed JSON from line {line_num}: {e_line} in line: '{line}'", file=sys.stderr)
                 except Exception as e_other:
                     print(f"An unexpected error occurred processing line {line_num}: {e_other} in line: '{line}'", file=sys.stderr)
@@ -126,6 +175,143 @@ def process_json_to_csv(input_file_path, output_file_path):
 
     write_to_csv(processed_data, output_file_path)
 
+# --- Feed Download ---
+def download_and_decompress_feed(api_url, token, output_path):
+    """
+    Streams a gzipped feed from curl straight into the gzip decompressor, writing only
+    the decompressed file to disk (no intermediate .gz file).
+    The feed is written to a per-process temporary file beside output_path and moved into
+    place only once it is complete, so an interrupted or concurrent run never leaves a
+    truncated feed at output_path.
+    Raises subprocess.CalledProcessError if curl fails; partial output is removed.
+    """
+    curl_command = [
+        "curl",
+        "--location", api_url,
+        "--header", f"Token: {token}", # Ensure correct header format
+    ]
+    temp_path = f"{output_path}.{os.getpid()}.part"
+    curl_process = None
+    decompressed_ok = False
+    try:
+        with open(temp_path, 'wb', buffering=STREAM_BUFFER_SIZE) as out_file:
+            curl_process = subprocess.Popen(curl_command, stdout=subprocess.PIPE, bufsize=STREAM_BUFFER_SIZE)
+            with gzip.GzipFile(fileobj=curl_process.stdout) as gz_stream:
+                shutil.copyfileobj(gz_stream, out_file, length=STREAM_BUFFER_SIZE)
+        decompressed_ok = True
+    finally:
+        returncode = None
+        if curl_process is not None:
+            curl_process.stdout.close()
+            if not decompressed_ok:
+                curl_process.kill()
+            returncode = curl_process.wait()
+        if decompressed_ok and returncode == 0:
+            os.replace(temp_path, output_path)
+        elif os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, curl_command)
+
+def is_nonempty_file(path):
+    """Returns True if path exists and is non-empty, using a single stat call."""
+    try:
+        return os.stat(path).st_size > 0
+    except FileNotFoundError:
+        return False
+
+# --- Queries ---
+def run_fused_queries(source_path, queries):
+    """
+    Scans source_path once and routes each line to the output file of every query whose
+    pattern matches it, replacing one grep pass per query.
+    queries is a list of (label, compiled bytes pattern, output path) tuples.
+    Returns the number of matching lines written for each query, in order.
+    """
+    match_counts = [0] * len(queries)
+    output_files = []
+    try:
+        for _, _, output_path in queries:
+            output_files.append(open(output_path, 'wb', buffering=STREAM_BUFFER_SIZE))
+        searches = [pattern.search for _, pattern, _ in queries]
+
+        with open(source_path, 'rb', buffering=STREAM_BUFFER_SIZE) as source_file:
+            for line in source_file:
+                for i, search in enumerate(searches):
+                    if search(line):
+                        if not line.endswith(b'\n'):
+                            line += b'\n'
+                        output_files[i].write(line)
+                        match_counts[i] += 1
+    finally:
+        for output_file in output_files:
+            output_file.close()
+    return match_counts
+
+# --- Feed Cache ---
+def get_feed_cache_key(api_url, token, current_date):
+    """
+    Builds a cache key for a feed from its URL and the validators (ETag, Last-Modified,
+    Content-Length) returned by a HEAD request. Falls back to the URL and current date
+    when the server does not provide any validators or the final response is not a 2xx
+    (an error page's validators say nothing about the feed).
+    Pass current_date=None for feeds that change within a day: None is then returned
+    instead of a date key, and the feed should be downloaded without the cache.
+    """
+    head_command = [
+        "curl",
+        "--silent", "--head", "--location", api_url,
+        "--header", f"Token: {token}",
+    ]
+    validators = []
+    try:
+        # Read as bytes: text mode would turn the CRLF line endings that separate the blocks into '\n'
+        head_result = subprocess.run(head_command, capture_output=True, check=True)
+        # With --location curl prints one header block per hop; only the final response matters
+        final_headers = head_result.stdout.strip().split(b"\r\n\r\n")[-1].decode("latin-1").splitlines()
+        # Status line, e.g. 'HTTP/1.1 200 OK' or 'HTTP/2 200'
+        status_parts = final_headers[0].split() if final_headers else []
+        if len(status_parts) >= 2 and status_parts[1].startswith("2"):
+            for header_line in final_headers[1:]:
+                name, _, value = header_line.partition(":")
+                if name.strip().lower() in ("etag", "last-modified", "content-length"):
+                    validators.append(f"{name.strip().lower()}={value.strip()}")
+        else:
+            print(f"Warning: Feed metadata request returned '{final_headers[0] if final_headers else 'no response'}'; not using its headers for caching.", file=sys.stderr)
+    except (subprocess.CalledProcessError, OSError) as e:
+        print(f"Warning: Could not fetch feed metadata for caching: {e}", file=sys.stderr)
+
+    if not validators:
+        if current_date is None:
+            return None
+        validators.append(f"date={current_date}")
+
+    key_source = "|".join([api_url] + sorted(validators))
+    return hashlib.sha256(key_source.encode("utf-8")).hexdigest()
+
+def purge_stale_feed_cache(cache_dir, max_age_days):
+    """Removes cached feed files that have not been modified in max_age_days."""
+    if not os.path.isdir(cache_dir):
+        return
+    cutoff = time.time() - max_age_days * 24 * 60 * 60
+    for entry in os.scandir(cache_dir):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                print(f"Removed stale cached feed: {entry.path}")
+        except OSError as e:
+            print(f"Warning: Could not remove stale cached feed {entry.path}: {e}", file=sys.stderr)
+
+def link_cached_feed(cached_path, output_path):
+    """Exposes a cached feed at output_path, symlinking where possible and copying otherwise."""
+    if os.path.lexists(output_path):
+        os.remove(output_path)
+    try:
+        os.symlink(os.path.abspath(cached_path), output_path)
+    except (OSError, NotImplementedError):
+        shutil.copyfile(cached_path, output_path)
+
 # --- Main Script Logic ---
 if __name__ == "__main__":
     # Default date format to YYYYMMDD (4-digit year)
@@ -176,9 +362,9 @@ if __name__ == "__main__":
             sys.exit(1)
 
         feed_options = {
-            "1": {"name": "AnonRes", "url": "https://feeds.spur.us/v2/anonymous-residential/latest.json.gz", "base_filename": "AnonRes"},
-            "2": {"name": "AnonRes Realtime", "url": "https://feeds.spur.us/v2/anonymous-residential/realtime/latest.json.gz", "base_filename": "AnonResRT"},
-            "3": {"name": "Anonymous", "url": "https://feeds.spur.us/v2/anonymous/latest.json.gz", "base_filename": "Anonymous"},
+            "1": {"name": "AnonRes", "url": "https://feeds.spur.us/v2/anonymous-residential/latest.json.gz", "base_filename": "AnonRes", "realtime": False},
+            "2": {"name": "AnonRes Realtime", "url": "https://feeds.spur.us/v2/anonymous-residential/realtime/latest.json.gz", "base_filename": "AnonResRT", "realtime": True},
+            "3": {"name": "Anonymous", "url": "https://feeds.spur.us/v2/anonymous/latest.json.gz", "base_filename": "Anonymous", "realtime": False},
         }
 
         selected_feed = None
@@ -195,32 +381,37 @@ if __name__ == "__main__":
         api_url = selected_feed["url"]
         base_filename = selected_feed["base_filename"] # Assign base_filename from selected feed
 
-        gz_filename = f"{current_date}{base_filename}.json.gz"
         # Crucial fix: ensure decompressed_source_file also has .json extension
         decompressed_source_file = f"{current_date}{base_filename}.json" 
 
-        print(f"Fetching {api_url} to {gz_filename}...")
-        try:
-            curl_command = [
-                "curl",
-                "--location", api_url,
-                "--header", f"Token: {TOKEN}", # Ensure correct header format
-                "--output", gz_filename
-            ]
-            subprocess.run(curl_command, check=True)
-            print(f"Successfully downloaded {gz_filename}")
-        except subprocess.CalledProcessError as e:
-            print(f"Error downloading file: {e}", file=sys.stderr)
-            sys.exit(1)
+        purge_stale_feed_cache(FEED_CACHE_DIR, FEED_CACHE_MAX_AGE_DAYS)
+        # The realtime feed changes within a day, so it is never cached by date
+        cache_key = get_feed_cache_key(api_url, TOKEN, None if selected_feed["realtime"] else current_date)
+        cached_feed_path = os.path.join(FEED_CACHE_DIR, cache_key + ".json") if cache_key else None
 
-        print(f"Decompressing {gz_filename}...")
-        try:
-            # gunzip -df will decompress in place, typically removing only the .gz, leaving .json
-            subprocess.run(["gunzip", "-df", gz_filename], check=True)
-            print(f"Successfully decompressed {gz_filename} to {decompressed_source_file}")
-        except subprocess.CalledProcessError as e:
-            print(f"Error decompressing file: {e}", file=sys.stderr)
-            sys.exit(1)
+        if cached_feed_path and is_nonempty_file(cached_feed_path):
+            print(f"Feed unchanged since last download. Using cached copy: {cached_feed_path}")
+        else:
+            download_path = cached_feed_path or decompressed_source_file
+            if not cached_feed_path:
+                print("Feed metadata unavailable; downloading without the cache.", file=sys.stderr)
+            print(f"Fetching and decompressing {api_url} to {download_path}...")
+            try:
+                if cached_feed_path:
+                    os.makedirs(FEED_CACHE_DIR, exist_ok=True)
+                download_and_decompress_feed(api_url, TOKEN, download_path)
+                print(f"Successfully downloaded and decompressed to {download_path}")
+            except (subprocess.CalledProcessError, OSError, EOFError) as e:
+                print(f"Error downloading or decompressing file: {e}", file=sys.stderr)
+                sys.exit(1)
+
+        if cached_feed_path:
+            try:
+                link_cached_feed(cached_feed_path, decompressed_source_file)
+                print(f"Feed available at {decompressed_source_file}")
+            except OSError as e:
+                print(f"Error exposing cached feed at {decompressed_source_file}: {e}", file=sys.stderr)
+                sys.exit(1)
     else:
         print("Invalid response. Please answer 'Y' or 'N'. Exiting.", file=sys.stderr)
         sys.exit(1)
@@ -232,38 +423,24 @@ if __name__ == "__main__":
 
     # All subsequent output filenames now dynamically use current_date and base_filename
 
-    # Query 1: grep for "country":"KP"
+    # Queries 1 & 2: "country":"KP" and "services":["TROJAN"], evaluated together in a single pass
     kp_ips_filename = f"{current_date}{base_filename}KPIPs.txt"
-    print(f"Running query for 'country':'KP' against {decompressed_source_file}...")
-    try:
-        with open(kp_ips_filename, 'w') as kp_file:
-            grep_kp_command = ["grep", "-i", "-E", "country\":\"KP", decompressed_source_file]
-            subprocess.run(grep_kp_command, stdout=kp_file, check=True)
-        print(f"Results for 'country':'KP' written to {kp_ips_filename}")
-    except subprocess.CalledProcessError as e:
-        if e.returncode == 1:
-            print(f"No matches found for 'country':'KP' in {decompressed_source_file}. This is not necessarily an error.", file=sys.stderr)
-        else:
-            print(f"An error occurred during grep execution for 'country':'KP': {e}", file=sys.stderr)
-    except Exception as e:
-        print(f"An unexpected error occurred during 'country':'KP' query: {e}", file=sys.stderr)
-
-    # Query 2: grep for "TROJAN" - Refined query
     trojan_ips_filename = f"{current_date}{base_filename}TrojanIPs.txt"
-    print(f"Running refined query for 'services:[\"TROJAN\"]' against {decompressed_source_file}...")
+    queries = [
+        ("'country':'KP'", re.compile(rb'country":"KP', re.IGNORECASE), kp_ips_filename),
+        # Refined regex to accurately find "services":["TROJAN"]
+        ("'services:[\"TROJAN\"]'", re.compile(rb'"services":\["TROJAN"\]', re.IGNORECASE), trojan_ips_filename),
+    ]
+    print(f"Running queries for {' and '.join(label for label, _, _ in queries)} against {decompressed_source_file}...")
     try:
-        with open(trojan_ips_filename, 'w') as trojan_file:
-            # Refined regex to accurately find "services":["TROJAN"]
-            grep_trojan_command = ["grep", "-i", "-E", "\"services\":\\[\"TROJAN\"\\]", decompressed_source_file]
-            subprocess.run(grep_trojan_command, stdout=trojan_file, check=True)
-        print(f"Results for 'services:[\"TROJAN\"]' written to {trojan_ips_filename}")
-    except subprocess.CalledProcessError as e:
-        if e.returncode == 1:
-            print(f"No matches found for 'services:[\"TROJAN\"]' in {decompressed_source_file}. This is not necessarily an error.", file=sys.stderr)
-        else:
-            print(f"An error occurred during grep execution for 'services:[\"TROJAN\"]': {e}", file=sys.stderr)
+        match_counts = run_fused_queries(decompressed_source_file, queries)
+        for (label, _, output_filename), match_count in zip(queries, match_counts):
+            if match_count:
+                print(f"Results for {label} ({match_count} lines) written to {output_filename}")
+            else:
+                print(f"No matches found for {label} in {decompressed_source_file}. This is not necessarily an error.", file=sys.stderr)
     except Exception as e:
-        print(f"An unexpected error occurred during 'TROJAN' query: {e}", file=sys.stderr)
+        print(f"An unexpected error occurred while running queries: {e}", file=sys.stderr)
 
     # New command: shuf -n 10000 <decompressed_source_file>
     shuf_filename = f"{current_date}{base_filename}10kShuf.txt"
@@ -282,28 +459,25 @@ if __name__ == "__main__":
 
     print("\nProcessing queried and shuffled data to CSV...")
 
-    # Process KP IPs
-    if os.path.exists(kp_ips_filename) and os.path.getsize(kp_ips_filename) > 0:
-        kp_output_csv = f"{current_date}{base_filename}KPIPs.csv"
-        print(f"Processing {kp_ips_filename} to {kp_output_csv}")
-        process_json_to_csv(kp_ips_filename, kp_output_csv)
-    else:
-        print(f"Skipping CSV conversion for {kp_ips_filename} as it does not exist or is empty.")
-
-    # Process Trojan IPs
-    if os.path.exists(trojan_ips_filename) and os.path.getsize(trojan_ips_filename) > 0:
-        trojan_output_csv = f"{current_date}{base_filename}TrojanIPs.csv"
-        print(f"Processing {trojan_ips_filename} to {trojan_output_csv}")
-        process_json_to_csv(trojan_ips_filename, trojan_output_csv)
-    else:
-        print(f"Skipping CSV conversion for {trojan_ips_filename} as it does not exist or is empty.")
-
-    # Process 10k Shuffled data
-    if os.path.exists(shuf_filename) and os.path.getsize(shuf_filename) > 0:
-        shuf_output_csv = f"{current_date}{base_filename}10kShuf.csv"
-        print(f"Processing {shuf_filename} to {shuf_output_csv}")
-        process_json_to_csv(shuf_filename, shuf_output_csv)
-    else:
-        print(f"Skipping CSV conversion for {shuf_filename} as it does not exist or is empty.")
+    # Collect the conversions to run: KP IPs, Trojan IPs and the 10k shuffled sample
+    csv_conversions = []
+    for txt_filename, csv_suffix in [
+        (kp_ips_filename, "KPIPs.csv"),
+        (trojan_ips_filename, "TrojanIPs.csv"),
+        (shuf_filename, "10kShuf.csv"),
+    ]:
+        if is_nonempty_file(txt_filename):
+            output_csv = f"{current_date}{base_filename}{csv_suffix}"
+            print(f"Processing {txt_filename} to {output_csv}")
+            csv_conversions.append((txt_filename, output_csv))
+        else:
+            print(f"Skipping CSV conversion for {txt_filename} as it does not exist or is empty.")
+
+    # The conversions are independent and CPU-bound, so run them in separate processes
+    if csv_conversions:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=len(csv_conversions)) as executor:
+            futures = [executor.submit(process_json_to_csv, txt_filename, output_csv) for txt_filename, output_csv in csv_conversions]
+            for future in futures:
+                future.result()
 
     print("\nScript finished.")
@@ -9,31 +9,355 @@ import time
 import requests # For downloading feeds
 import gzip # For decompressing feeds
 import shutil # For moving files safely
+import operator # For numerical keyword comparisons
+import itertools # For bounded line sampling
+import collections # For compact filter criteria records
+import mmap # For sharing the source file's page cache across workers
+import threading # For guarding shared download progress
+import concurrent.futures # For parallel ranged downloads
+import argparse # For headless runs from a config file
+
+# --- Optional: ISA-L accelerated gzip decompression (python-isal) ---
+try:
+    from isal import igzip
+    _ISAL_AVAILABLE = True
+except ImportError:
+    _ISAL_AVAILABLE = False
+# --- End Optional Import ---
+
+# --- Optional: orjson for faster JSON parsing (falls back to the stdlib json module) ---
+try:
+    import orjson # Accepts bytes directly; orjson.JSONDecodeError subclasses json.JSONDecodeError
+    _ORJSON_AVAILABLE = True
+except ImportError:
+    _ORJSON_AVAILABLE = False
+# --- End Optional Import ---
+
+# --- Optional: pyahocorasick for matching many substring keywords in one pass ---
+try:
+    import ahocorasick
+    _AHOCORASICK_AVAILABLE = True
+except ImportError:
+    _AHOCORASICK_AVAILABLE = False
+# --- End Optional Import ---
 
 # --- Configuration ---
 # API Token for downloading feeds (if chosen by user)
 API_TOKEN = os.environ.get('TOKEN') 
 
+# Numerical keyword syntax: optional comparison operator followed by a number (e.g. '>50', '<=100', '=443')
+NUMERIC_KEYWORD_PATTERN = re.compile(r'([<>]?=?)\s*(\-?\d+(\.\d+)?)$')
+NUMERIC_KEYWORD_OPERATORS = {
+    '>': operator.gt, '<': operator.lt, '>=': operator.ge, '<=': operator.le, '=': operator.eq, '': operator.eq,
+}
+# Python source for each comparison, used when generating the specialized record matcher
+NUMERIC_OPERATOR_SOURCE = {operator.gt: '>', operator.lt: '<', operator.ge: '>=', operator.le: '<=', operator.eq: '=='}
+
+# Flattened keys of list items (e.g. 'tunnels_0_operator') are suggested without their index ('tunnels_operator')
+INDEXED_KEY_PATTERN = re.compile(r'(.+?)_\d+_(.+)')
+# Splits a suggested key into its root and sub key for value sampling (e.g. 'tunnels_operator' -> 'tunnels', 'operator')
+KEY_SPLIT_PATTERN = re.compile(r'(.+?)_(.+)')
+
+# The key pre-scan stops early once this many consecutive lines have shown no new key layout (0 = never)
+KEY_SCAN_STABLE_LINES = 10000
+
+# Bytes read from the start of the file by the quick (single-process) key scan
+QUICK_KEY_SCAN_BYTES = 4 * 1024 * 1024
+
+# OR'd substring keywords are matched with one Aho-Corasick automaton (if pyahocorasick is installed) from this many up
+AHOCORASICK_MIN_KEYWORDS = 8
+
+# Spur feed filenames: YYYYMMDD date, optional HHMMSS time, feed name and extension (e.g. '20240610AnonRes.json')
+FEED_FILENAME_PATTERN = re.compile(r'(\d{8})(\d{6})?(AnonRes|AnonResRT|Anonymous|IPGeoMMDB|IPGeoJSON|ServiceMetricsAll|DCH|AnonymousIPv6|AnonymousResidentialIPv6|AnonymousResidential|AnonymousResidentialRT|IPSummary|SimilarIPs|AIData)\.(json|mmdb|json\.gz)$', re.IGNORECASE)
+# Date/time prefix stripped from other filenames to guess the feed name
+FEED_DATE_PREFIX_PATTERN = re.compile(r'^\d{8}(\d{6})?')
+
+# orjson turns integers wider than 64 bits into floats, so lines holding a run of this many digits
+# (found by masking every byte to '0' or ' ') are parsed by the stdlib json module instead
+JSON_LONG_DIGIT_RUN = b'0' * 19
+JSON_DIGIT_MASK_TABLE = bytes(0x30 if 0x30 <= c <= 0x39 else 0x20 for c in range(256))
+
+# Bytes str.strip() removes from an ASCII-only line, so raw lines can be stripped without decoding them
+ASCII_WHITESPACE_BYTES = b' \t\n\r\x0b\x0c\x1c\x1d\x1e\x1f'
+
+# Filename sanitizing: deletes every ASCII character except letters and digits (non-ASCII is dropped by encoding first)
+FILENAME_PART_TABLE = str.maketrans('', '', ''.join(chr(c) for c in range(128) if not chr(c).isalnum()))
+
+# The filter pass splits the file into at least this many chunks per worker, so a worker that draws dense or long
+# records finishes its last chunk soon after the others instead of leaving them idle
+FILTER_CHUNKS_PER_PROCESS = 8
+
+# Lines from the start of the file used to estimate how often each filter condition matches, so the
+# matcher can try the most decisive condition first (0 = keep the entered order)
+CRITERIA_ORDER_SAMPLE_LINES = 10000
+
+# Raw (non-gzip) downloads are split into this many parallel ranged GETs when the server supports it (1 = single stream)
+PARALLEL_DOWNLOAD_CONNECTIONS = 4
+# Files smaller than this are always downloaded over a single connection
+PARALLEL_DOWNLOAD_MIN_SIZE = 64 * 1024 * 1024
+
+# One filter condition as entered by the user; keywords is a tuple of lowercased keyword strings
+FilterSpec = collections.namedtuple('FilterSpec', 'key keywords match_type_keywords')
+# A headless run loaded from a --config file; filter_criteria is a list of FilterSpec
+FilterConfig = collections.namedtuple('FilterConfig', 'input_file filter_criteria match_type output_file')
+
+# --- Worker State (populated once per worker process by init_worker) ---
+_worker_source_mmap = None
+_worker_line_prefilter = None
+_worker_match_record = None
+
 # --- Functions ---
+def json_loads(data):
+    """
+    Parses one feed line (bytes or str) as the stdlib parser reads it decoded with errors='ignore'.
+    orjson parses bytes when installed; lines it would read differently (invalid UTF-8, which it
+    rejects, and integers wider than 64 bits) go to the stdlib parser instead.
+    """
+    if _ORJSON_AVAILABLE and isinstance(data, bytes) and JSON_LONG_DIGIT_RUN not in data.translate(JSON_DIGIT_MASK_TABLE):
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    if isinstance(data, bytes):
+        data = data.decode('utf-8', errors='ignore')
+    return json.loads(data.strip())
+
 def flatten_json(json_data, parent_key='', sep='_'):
-    """Flattens a nested JSON object into a single dictionary."""
-    items = []
-    for k, v in json_data.items():
-        new_key = parent_key + sep + k if parent_key else k
-        if isinstance(v, dict):
-            items.extend(flatten_json(v, new_key, sep=sep).items())
-        elif isinstance(v, list):
-            if all(not isinstance(item, dict) for item in v):
-                items.append((new_key, ','.join(map(str, v))))
+    """
+    Flattens a nested JSON object into a single dictionary.
+    Iterative: a stack of (key prefix, item iterator) frames replaces the recursion, so keys come
+    out in the same depth-first order, and a later duplicate name overwrites the earlier value,
+    exactly as a recursive walk would.
+    """
+    flattened = {}
+    _isinstance, _dict, _list, _str = isinstance, dict, list, str
+    # Frames: (prefix including separator, iterator of (name, value), True inside a list of dictionaries)
+    stack = [(parent_key + sep if parent_key else '', iter(json_data.items()), False)]
+    while stack:
+        prefix, items, in_list = stack[-1]
+        for k, v in items:
+            new_key = prefix + k
+            if _isinstance(v, _dict):
+                # Descend now; this frame resumes after the nested object is done
+                stack.append((new_key + sep, iter(v.items()), False))
+                break
+            if in_list:
+                # Other items of a list holding dictionaries are indexed as-is
+                flattened[new_key] = v
+            elif _isinstance(v, _list):
+                for item in v:
+                    if _isinstance(item, _dict):
+                        break
+                else:
+                    # No dictionaries: join the simple values into one comma-separated string
+                    flattened[new_key] = ','.join(map(_str, v))
+                    continue
+                stack.append((new_key + sep, zip(map(_str, range(len(v))), v), True))
+                break
             else:
-                for i, item in enumerate(v):
-                    if isinstance(item, dict):
-                        items.extend(flatten_json(item, new_key + sep + str(i), sep=sep).items())
-                    else:
-                        items.append((new_key + sep + str(i), item))
+                flattened[new_key] = v
         else:
-            items.append((new_key, v))
-    return dict(items)
+            stack.pop()
+    return flattened
+
+_FLAT_KEY_MISSING = object()
+
+def find_flat_value(json_data, flat_key, sep='_'):
+    """
+    Returns the value flatten_json(json_data) would produce for flat_key, or _FLAT_KEY_MISSING,
+    walking only the branches whose key is a prefix of flat_key. When several branches produce
+    the same flattened name, the one flatten_json writes last (the later key) wins.
+    """
+    found_key = None
+    found_value = _FLAT_KEY_MISSING
+
+    if flat_key in json_data:
+        value = json_data[flat_key]
+        if isinstance(value, list):
+            if all(not isinstance(item, dict) for item in value):
+                found_key, found_value = flat_key, ','.join(map(str, value))
+        elif not isinstance(value, dict):
+            found_key, found_value = flat_key, value
+
+    # Try each prefix of flat_key that ends just before a separator
+    sep_pos = flat_key.find(sep)
+    while sep_pos != -1:
+        prefix = flat_key[:sep_pos]
+        if prefix in json_data:
+            value = json_data[prefix]
+            rest = flat_key[sep_pos + len(sep):]
+            found = _FLAT_KEY_MISSING
+            if isinstance(value, dict):
+                found = find_flat_value(value, rest, sep)
+            elif isinstance(value, list) and any(isinstance(item, dict) for item in value):
+                index_str, _, sub_key = rest.partition(sep)
+                if index_str.isdigit() and str(int(index_str)) == index_str and int(index_str) < len(value):
+                    item = value[int(index_str)]
+                    if isinstance(item, dict):
+                        if sub_key:
+                            found = find_flat_value(item, sub_key, sep)
+                    elif not sub_key:
+                        found = item
+            if found is not _FLAT_KEY_MISSING:
+                if found_value is _FLAT_KEY_MISSING:
+                    found_key, found_value = prefix, found
+                else:
+                    # Flattened names collide: flatten_json writes the later key's value last
+                    key_order = list(json_data)
+                    if key_order.index(prefix) > key_order.index(found_key):
+                        found_key, found_value = prefix, found
+        sep_pos = flat_key.find(sep, sep_pos + 1)
+    return found_value
+
+def get_flat_value(json_data, flat_key, sep='_'):
+    """
+    Returns the value flatten_json(json_data) would produce for flat_key (or None), walking
+    only the branches whose key is a prefix of flat_key instead of flattening the whole object.
+    """
+    value = find_flat_value(json_data, flat_key, sep)
+    return None if value is _FLAT_KEY_MISSING else value
+
+def scan_keys_in_range(mm, start_byte, end_byte, max_lines, stable_lines=KEY_SCAN_STABLE_LINES):
+    """
+    Collects the flattened keys and their de-indexed suggested forms from up to max_lines lines
+    starting in [start_byte, end_byte) of a memory-mapped feed.
+    Records of a feed share a handful of key layouts, so each distinct layout is only normalized
+    once, and the scan stops early after stable_lines consecutive lines without a new layout.
+    Returns (flattened_keys, suggested_keys, lines_scanned).
+    """
+    flattened_keys = set()
+    suggested_keys = set()
+    seen_layouts = set()
+    lines_scanned = 0
+    lines_since_new_layout = 0
+    mm.seek(start_byte)
+    read_line = mm.readline
+    current_byte = start_byte
+    while current_byte < end_byte and lines_scanned < max_lines:
+        raw_line = read_line()
+        current_byte += len(raw_line)
+        lines_scanned += 1
+        try:
+            obj = json_loads(raw_line)
+        except json.JSONDecodeError:
+            continue
+        if not isinstance(obj, dict):
+            continue
+
+        layout = tuple(flatten_json(obj))
+        if layout in seen_layouts:
+            lines_since_new_layout += 1
+            if stable_lines and lines_since_new_layout >= stable_lines:
+                break
+            continue
+        seen_layouts.add(layout)
+        lines_since_new_layout = 0
+
+        for key in layout:
+            if key not in flattened_keys:
+                flattened_keys.add(key)
+                match = INDEXED_KEY_PATTERN.match(key)
+                suggested_keys.add(f"{match.group(1)}_{match.group(2)}" if match else key)
+    return flattened_keys, suggested_keys, lines_scanned
+
+def discover_keys_in_chunk(args_tuple):
+    """Pool task: scans one chunk of the worker's memory-mapped source file for filterable keys."""
+    start_byte, end_byte, max_lines = args_tuple
+    if _worker_source_mmap is None:
+        return set(), set(), 0
+    return scan_keys_in_range(_worker_source_mmap, start_byte, end_byte, max_lines)
+
+def discover_feed_keys(filepath, max_lines, num_processes, quick=False):
+    """
+    Discovers the filterable keys of a feed.
+    The sample of max_lines lines is spread over the file's chunks and scanned in parallel, and
+    the per-chunk key sets are unioned. With quick=True only the first QUICK_KEY_SCAN_BYTES of the
+    file are scanned in this process, which is usually enough since feed schemas are uniform.
+    Returns (flattened_keys, suggested_keys, lines_scanned).
+    """
+    flattened_keys = set()
+    suggested_keys = set()
+    lines_scanned = 0
+    try:
+        if quick:
+            with open(filepath, 'rb') as f_sample:
+                file_size = os.fstat(f_sample.fileno()).st_size
+                if file_size > 0:
+                    with mmap.mmap(f_sample.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        return scan_keys_in_range(mm, 0, min(file_size, QUICK_KEY_SCAN_BYTES), max_lines)
+            return flattened_keys, suggested_keys, lines_scanned
+
+        chunks = get_file_chunks(filepath, num_processes)
+        if not chunks:
+            return flattened_keys, suggested_keys, lines_scanned
+        lines_per_chunk = -(-max_lines // len(chunks))
+        with get_pool_context().Pool(processes=num_processes, initializer=init_worker, initargs=(filepath,)) as pool:
+            for chunk_flattened, chunk_suggested, chunk_lines in pool.imap_unordered(
+                    discover_keys_in_chunk, [(start, end, lines_per_chunk) for start, end in chunks]):
+                flattened_keys |= chunk_flattened
+                suggested_keys |= chunk_suggested
+                lines_scanned += chunk_lines
+    except Exception as e:
+        print(f"Error sampling keys from '{filepath}': {e}", file=sys.stderr)
+    return flattened_keys, suggested_keys, lines_scanned
+
+def sanitize_filename_part(text):
+    """Keeps only the ASCII letters and digits of text, title-cased, for use in a generated filename."""
+    return text.encode('ascii', 'ignore').decode('ascii').translate(FILENAME_PART_TABLE).title()
+
+class SampleValueCache:
+    """
+    Indexes the values of the first lines of the source file by flattened key, parsing and
+    flattening each line once, so every value sampling prompt after the first is answered from
+    memory. Only each distinct value and the first line it appeared on are kept, not the records,
+    so memory grows with the number of distinct values instead of lines times keys.
+    Grows only when a prompt asks for more lines than have been read so far.
+    """
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.values_by_key = {}
+        self.lines_read = 0
+        self.reached_eof = False
+
+    def get_values(self, flattened_keys, num_lines):
+        """Returns the set of stripped values (joined lists split on commas) the given keys hold in the first num_lines lines."""
+        if self.lines_read < num_lines and not self.reached_eof:
+            values_by_key = self.values_by_key
+            line_index = self.lines_read
+            with open(self.filepath, 'rb') as f_sample:
+                for line in itertools.islice(f_sample, self.lines_read, num_lines):
+                    try:
+                        obj = json_loads(line)
+                    except json.JSONDecodeError:
+                        obj = None
+                    if isinstance(obj, dict):
+                        for f_key, value in flatten_json(obj).items():
+                            if value is None:
+                                continue
+                            key_values = values_by_key.get(f_key)
+                            if key_values is None:
+                                key_values = values_by_key[f_key] = {}
+                            if not isinstance(value, str):
+                                key_values.setdefault(str(value).strip(), line_index)
+                            elif ',' in value:
+                                # Only joined lists need splitting
+                                for individual_value in value.split(','):
+                                    key_values.setdefault(individual_value.strip(), line_index)
+                            else:
+                                key_values.setdefault(value.strip(), line_index)
+                    line_index += 1
+            if line_index < num_lines:
+                self.reached_eof = True
+            self.lines_read = line_index
+        return {value for f_key in flattened_keys
+                for value, first_line in self.values_by_key.get(f_key, {}).items() if first_line < num_lines}
+
+def index_keys_by_root(flattened_keys):
+    """Groups flattened keys by their first '_'-separated segment, so keys under one root can be found without a full scan."""
+    keys_by_root = {}
+    for key in flattened_keys:
+        keys_by_root.setdefault(key.split('_', 1)[0], []).append(key)
+    return keys_by_root
 
 def get_output_filename(current_date_ymd, current_time_hms, base_feed_name, user_filename, filter_criteria, overall_match_type):
     """Determines the output filename."""
@@ -55,16 +379,16 @@ def get_output_filename(current_date_ymd, current_time_hms, base_feed_name, user
 
     if filter_criteria:
         for i, criterion in enumerate(filter_criteria):
-            key_name = criterion['key']
-            kws = criterion['keywords']
+            key_name = criterion.key
+            kws = criterion.keywords
 
             if key_name:
-                sanitized_key_name = re.sub(r'[^a-zA-Z0-9]', '', key_name).title()
+                sanitized_key_name = sanitize_filename_part(key_name)
                 if sanitized_key_name:
                     filename_parts.append(sanitized_key_name)
             
             if kws:
-                sanitized_keywords = [re.sub(r'[^a-zA-Z0-9]', '', kw).title() for kw in kws][:3]
+                sanitized_keywords = [sanitize_filename_part(kw) for kw in kws[:3]]
                 if sanitized_keywords:
                     filename_parts.append("".join(sanitized_keywords))
             
@@ -78,8 +402,12 @@ def get_file_chunks(filepath, min_chunks):
     """
     Determines byte offsets for splitting a file.
     OPTIMIZATION: Targets ~64MB chunks to prevent memory bloat in workers.
+    Boundaries are aligned to line starts with a single mmap.find per chunk, so no line is read
+    (or allocated) just to be skipped, however long it is.
     """
     file_size = os.path.getsize(filepath)
+    if file_size == 0:
+        return []
     
     # Target chunk size: 64MB (safe for memory even with 100% match rate)
     TARGET_CHUNK_SIZE = 64 * 1024 * 1024
@@ -91,256 +419,647 @@ def get_file_chunks(filepath, min_chunks):
     chunk_size = file_size // num_chunks
     
     chunks = []
-    with open(filepath, 'rb') as f:
-        for i in range(num_chunks):
-            start_byte = i * chunk_size
-            end_byte = (i + 1) * chunk_size if i < num_chunks - 1 else file_size
-            
-            if start_byte > 0:
-                f.seek(start_byte - 1)
-                f.readline() 
-                start_byte = f.tell()
-            
+    with open(filepath, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        # Each chunk starts just past the first newline at or after its raw offset and ends where the next one starts
+        aligned_starts = [0]
+        for i in range(1, num_chunks):
+            newline_pos = mm.find(b'\n', i * chunk_size - 1)
+            aligned_starts.append(newline_pos + 1 if newline_pos != -1 else file_size)
+        aligned_starts.append(file_size)
+        
+        for start_byte, end_byte in zip(aligned_starts, aligned_starts[1:]):
             if start_byte < end_byte:
                 chunks.append((start_byte, end_byte))
                 
     return chunks
 
+def prepare_filter_criteria(filter_criteria):
+    """
+    Pre-classifies every keyword of every criterion once, so the per-line loop only dispatches on
+    a test kind instead of re-parsing keyword syntax for every record.
+    Returns a list of (key_name, is_tunnels_key, keyword_tests, match_type_keywords) tuples, where
+    keyword_tests is a list of (test_kind, payload, is_negation) and test_kind is one of
+    'empty', 'notempty', 'num' (payload: (compare_function, target_num)), 'exact' (payload: whole
+    value) or 'substr' (payload: substring).
+    A criterion made only of plain substrings becomes one 'substr_any' (OR) or 'substr_all' (AND) test
+    whose payload is the tuple of substrings, checked in one tight loop without per-keyword dispatch.
+    One made only of OR'd exact values becomes an 'exact_any' test: a single frozenset lookup.
+    """
+    prepared_criteria = []
+    for criterion in filter_criteria:
+        key_name = criterion.key
+        keyword_tests = []
+        for kw in criterion.keywords:
+            # Handle Negation Logic (!)
+            is_negation = False
+            clean_kw = kw
+            if kw.startswith('!') and kw != '!=empty':
+                is_negation = True
+                clean_kw = kw[1:]
+
+            if clean_kw == '=empty':
+                keyword_tests.append(('empty', None, is_negation))
+            elif clean_kw == '!=empty':
+                keyword_tests.append(('notempty', None, is_negation))
+            elif clean_kw.startswith('==') and len(clean_kw) > 2:
+                keyword_tests.append(('exact', clean_kw[2:], is_negation))
+            else:
+                num_match = NUMERIC_KEYWORD_PATTERN.match(clean_kw)
+                if num_match:
+                    compare_function = NUMERIC_KEYWORD_OPERATORS[num_match.group(1)]
+                    keyword_tests.append(('num', (compare_function, float(num_match.group(2))), is_negation))
+                else:
+                    keyword_tests.append(('substr', clean_kw, is_negation))
+
+        if len(keyword_tests) > 1 and all(test_kind == 'substr' and not is_negation for test_kind, _, is_negation in keyword_tests):
+            grouped_kind = 'substr_any' if criterion.match_type_keywords == 'OR' else 'substr_all'
+            keyword_tests = [(grouped_kind, tuple(payload for _, payload, _ in keyword_tests), False)]
+        elif (len(keyword_tests) > 1 and criterion.match_type_keywords == 'OR'
+              and all(test_kind == 'exact' and not is_negation for test_kind, _, is_negation in keyword_tests)):
+            keyword_tests = [('exact_any', frozenset(payload for _, payload, _ in keyword_tests), False)]
+
+        is_tunnels_key = bool(key_name) and key_name.startswith('tunnels_')
+        prepared_criteria.append((key_name, is_tunnels_key, keyword_tests, criterion.match_type_keywords))
+    return prepared_criteria
+
+def is_prefilter_safe_literal(substring):
+    """
+    Returns True if a substring keyword is guaranteed to appear verbatim (ignoring ASCII case) in
+    an ASCII raw JSON line without \\u escapes whenever it appears in a parsed value. Excludes
+    anything that other JSON escaping, list joining or number/None formatting could make differ
+    between the raw line and the value.
+    """
+    if not substring or not substring.isascii():
+        return False
+    # JSON may escape '/' as '\/', so it is not allowed even though it is printable ASCII
+    if any(not ((ch.isascii() and ch.isalnum()) or ch in "_-.:@ ") for ch in substring):
+        return False
+    # Numbers can be re-formatted by the parser (e.g. 1e2 -> 100.0) and a null inside a joined
+    # list becomes 'None', so require a letter that cannot come from either.
+    if not any(ch.isalpha() and ch != 'e' for ch in substring) or substring in 'none':
+        return False
+    return True
+
+def build_substring_automaton(substrings):
+    """Builds an Aho-Corasick automaton that finds any of the given substrings in one pass over a string."""
+    automaton = ahocorasick.Automaton()
+    for substring in substrings:
+        automaton.add_word(substring, substring)
+    automaton.make_automaton()
+    return automaton
+
+def build_line_prefilter(prepared_criteria, overall_match_type):
+    """
+    Derives the literal byte strings an ASCII raw line without \\u escapes must contain to possibly
+    match, so such lines can be rejected with a cheap substring scan before any JSON parsing.
+    Returns None when no safe prefilter exists, otherwise (overall_match_type, groups) where each
+    group is ('all' | 'any', [literal_bytes, ...]), or ('automaton', automaton) for a long 'any' list.
+    """
+    groups = []
+    for _, _, keyword_tests, match_type_keywords in prepared_criteria:
+        # Grouped tests are judged keyword by keyword here, and an exact value is also a substring of the line
+        if keyword_tests and keyword_tests[0][0] in ('substr_any', 'substr_all', 'exact_any'):
+            keyword_tests = [('substr', payload, False) for payload in keyword_tests[0][1]]
+        keyword_tests = [('substr' if test_kind == 'exact' else test_kind, payload, is_negation)
+                         for test_kind, payload, is_negation in keyword_tests]
+        group = None
+        if match_type_keywords == 'AND':
+            # Every non-negated substring keyword has to be present
+            literals = [payload.encode('ascii') for test_kind, payload, is_negation in keyword_tests
+                        if test_kind == 'substr' and not is_negation and is_prefilter_safe_literal(payload)]
+            if literals:
+                group = ('all', literals)
+        elif all(test_kind == 'substr' and not is_negation and is_prefilter_safe_literal(payload)
+                 for test_kind, payload, is_negation in keyword_tests):
+            # OR over plain substrings: at least one of them has to be present
+            if _AHOCORASICK_AVAILABLE and len(keyword_tests) >= AHOCORASICK_MIN_KEYWORDS:
+                group = ('automaton', build_substring_automaton([payload for _, payload, _ in keyword_tests]))
+            else:
+                group = ('any', [payload.encode('ascii') for _, payload, _ in keyword_tests])
+
+        if group is None:
+            if overall_match_type == 'OR':
+                # An unconstrained criterion can match any line on its own
+                return None
+            continue
+        groups.append(group)
+
+    if not groups:
+        return None
+    return (overall_match_type, groups)
+
+def line_passes_prefilter(raw_line_lower, line_prefilter):
+    """Checks a lowercased raw line against the literal groups from build_line_prefilter."""
+    overall_match_type, groups = line_prefilter
+    line_text = None
+    for group_mode, literals in groups:
+        if group_mode == 'all':
+            group_passed = all(literal in raw_line_lower for literal in literals)
+        elif group_mode == 'any':
+            group_passed = any(literal in raw_line_lower for literal in literals)
+        else:
+            # The literals are ASCII, so a latin-1 view of the bytes matches exactly where the bytes do
+            if line_text is None:
+                line_text = raw_line_lower.decode('latin-1')
+            group_passed = next(literals.iter(line_text), None) is not None
+        if group_passed and overall_match_type == 'OR':
+            return True
+        if not group_passed and overall_match_type == 'AND':
+            return False
+    return overall_match_type == 'AND'
+
+def init_worker(filepath, filter_criteria=None, overall_match_type='AND'):
+    """
+    Pool initializer: memory-maps the source file once per worker process. Every worker maps the
+    same file read-only, so they all scan the shared OS page cache instead of re-opening the file
+    and copying it through their own read buffers for every chunk.
+    When filter_criteria are given, the prefilter and the specialized record matcher are also built
+    here, once per worker, so chunk tasks carry only their byte range.
+    """
+    global _worker_source_mmap, _worker_line_prefilter, _worker_match_record
+    with open(filepath, 'rb') as f:
+        if os.fstat(f.fileno()).st_size > 0:
+            _worker_source_mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if filter_criteria is not None:
+        prepared_criteria = prepare_filter_criteria(filter_criteria)
+        _worker_line_prefilter = build_line_prefilter(prepared_criteria, overall_match_type)
+        _worker_match_record = build_record_matcher(prepared_criteria, overall_match_type)
+
+def advise_sequential_read(mm, start_byte, end_byte):
+    """
+    Tells the kernel a byte range of a memory map is about to be read front to back, so it reads
+    ahead aggressively instead of faulting pages in one at a time. No-op where madvise is missing.
+    """
+    if not hasattr(mm, 'madvise') or not hasattr(mmap, 'MADV_SEQUENTIAL') or end_byte <= start_byte:
+        return
+    aligned_start = start_byte - (start_byte % mmap.PAGESIZE)
+    try:
+        mm.madvise(mmap.MADV_SEQUENTIAL, aligned_start, end_byte - aligned_start)
+    except OSError:
+        pass
+
+def get_key_source_value(json_obj, key_name):
+    """Returns the lowercased value of a plain (non-tunnels) key for keyword matching, or None if unset."""
+    # Look up just this key instead of flattening the whole record
+    value = get_flat_value(json_obj, key_name)
+    if value is not None:
+        str_value = str(value).strip().lower()
+        if str_value not in ('none', 'null'):
+            return str_value
+    return None
+
+def flatten_tunnels(json_obj):
+    """
+    Flattens only the top-level entries whose flattened keys can start with 'tunnels_' (the
+    'tunnels' list itself and any 'tunnels_*' keys), giving the same tunnels_* keys, in the same
+    order, as flatten_json(json_obj) without walking the rest of the record.
+    """
+    return flatten_json({k: v for k, v in json_obj.items() if k == 'tunnels' or k.startswith('tunnels_')})
+
+def get_tunnels_source_value(flattened_obj, sub_key):
+    """Returns the comma-joined, lowercased values of every tunnels_<n>_<sub_key> key, or None if there are none."""
+    suffix = f'_{sub_key}'
+    relevant_keys = [k for k in flattened_obj.keys() if k.startswith('tunnels_') and k.endswith(suffix)]
+    if relevant_keys:
+        source_values = [str(flattened_obj[k]) for k in relevant_keys if str(flattened_obj[k]).strip().lower() not in ('none', 'null')]
+        return ','.join(source_values).lower()
+    return None
+
+def get_line_source_value(raw_line, raw_line_lower, line_stripped):
+    """
+    Returns the whole line lowercased for a general search, reusing the prefilter's bytes.lower() on
+    ASCII lines. line_stripped (the decoded line) is only given, and only needed, for non-ASCII lines.
+    """
+    if raw_line.isascii():
+        # ASCII-only: bytes.lower() is all str.lower() would do
+        if raw_line_lower is None:
+            raw_line_lower = raw_line.lower()
+        return raw_line_lower.decode('ascii').strip()
+    return line_stripped.lower()
+
+def parse_json_record(raw_line):
+    """Parses one feed line, raising ValueError unless it holds a JSON object."""
+    json_obj = json_loads(raw_line)
+    if not isinstance(json_obj, dict):
+        raise ValueError("Line is not a JSON object")
+    return json_obj
+
+def to_number(source_value):
+    """Returns source_value as a float for numerical keywords, or None if it is empty or not numerical."""
+    if source_value:
+        try:
+            return float(source_value)
+        except ValueError:
+            pass
+    return None
+
+def get_keyword_test_source(test_kind, payload, is_negation, value_var, number_var):
+    """Returns a Python expression evaluating one prepared keyword test against the named value variable."""
+    if test_kind == 'empty':
+        expression = f"(not {value_var} or not {value_var}.strip())"
+    elif test_kind == 'notempty':
+        expression = f"({value_var} and {value_var}.strip())"
+    elif test_kind == 'num':
+        compare_function, target_num = payload
+        expression = f"({number_var} is not None and {number_var} {NUMERIC_OPERATOR_SOURCE[compare_function]} {target_num!r})"
+    elif test_kind == 'substr':
+        expression = f"({value_var} and {payload!r} in {value_var})"
+    elif test_kind == 'exact':
+        expression = f"({value_var} == {payload!r})"
+    elif test_kind == 'exact_any':
+        expression = f"({value_var} in {payload!r})"
+    elif test_kind == 'substr_automaton':
+        # payload is the matcher namespace name of an automaton from build_substring_automaton
+        expression = f"({value_var} and next({payload}.iter({value_var}), None) is not None)"
+    else:
+        joiner = ' or ' if test_kind == 'substr_any' else ' and '
+        expression = f"({value_var} and ({joiner.join(f'{substring!r} in {value_var}' for substring in payload)}))"
+    return f"(not {expression})" if is_negation else expression
+
+def build_record_matcher(prepared_criteria, overall_match_type):
+    """
+    Generates and compiles a match_record(raw_line, raw_line_lower, line_stripped) function
+    specialized to the fixed filter criteria. Key names, substrings, thresholds and the AND/OR
+    structure become constants and plain boolean expressions in straight-line code, so the
+    per-line work has no test-kind dispatch, negation flags or match-type checks left.
+    Criteria short-circuit in order; the JSON object, flattened record and lowercased line are
+    each built at most once, at the first criterion that needs them. Raises on unparseable lines;
+    with only general searches the line is parsed just before it is accepted, so lines that are
+    not JSON objects never match.
+    """
+    namespace = {
+        'parse_json_record': parse_json_record, 'flatten_tunnels': flatten_tunnels, 'to_number': to_number,
+        'get_key_source_value': get_key_source_value, 'get_tunnels_source_value': get_tunnels_source_value,
+        'get_line_source_value': get_line_source_value,
+    }
+    source_lines = ["def match_record(raw_line, raw_line_lower, line_stripped):"]
+    json_ready = flattened_ready = line_lower_ready = False
+
+    # Under OR a later criterion's parse error must still reject a line an earlier one matched
+    if overall_match_type == 'OR' and any(key_name for key_name, _, _, _ in prepared_criteria):
+        source_lines.append("    json_obj = parse_json_record(raw_line)")
+        json_ready = True
+
+    for i, (key_name, is_tunnels_key, keyword_tests, match_type_keywords) in enumerate(prepared_criteria):
+        # --- Determine Source Value ---
+        if key_name and not json_ready:
+            source_lines.append("    json_obj = parse_json_record(raw_line)")
+            json_ready = True
+        if is_tunnels_key:
+            if not flattened_ready:
+                source_lines.append("    flattened_obj = flatten_tunnels(json_obj)")
+                flattened_ready = True
+            value_var = f"value_{i}"
+            source_lines.append(f"    {value_var} = get_tunnels_source_value(flattened_obj, {key_name.split('_', 1)[1]!r})")
+        elif key_name:
+            value_var = f"value_{i}"
+            source_lines.append(f"    {value_var} = get_key_source_value(json_obj, {key_name!r})")
+        else: # General search
+            if not line_lower_ready:
+                source_lines.append("    line_lower = get_line_source_value(raw_line, raw_line_lower, line_stripped)")
+                line_lower_ready = True
+            value_var = "line_lower"
+
+        number_var = f"number_{i}"
+        if any(test_kind == 'num' for test_kind, _, _ in keyword_tests):
+            source_lines.append(f"    {number_var} = to_number({value_var})")
+
+        # --- Evaluate Keywords ---
+        keyword_sources = []
+        for test_kind, payload, is_negation in keyword_tests:
+            if test_kind == 'substr_any' and _AHOCORASICK_AVAILABLE and len(payload) >= AHOCORASICK_MIN_KEYWORDS:
+                # Many alternatives: one automaton pass over the value instead of a scan per substring
+                automaton_name = f"automaton_{i}"
+                namespace[automaton_name] = build_substring_automaton(payload)
+                test_kind, payload = 'substr_automaton', automaton_name
+            keyword_sources.append(get_keyword_test_source(test_kind, payload, is_negation, value_var, number_var))
+        if keyword_sources:
+            condition = (' and ' if match_type_keywords == 'AND' else ' or ').join(keyword_sources)
+        else:
+            condition = 'True' if match_type_keywords == 'AND' else 'False'
+
+        if overall_match_type == 'AND':
+            source_lines.append(f"    if not ({condition}): return False")
+        elif json_ready:
+            source_lines.append(f"    if {condition}: return True")
+        else:
+            source_lines.append(f"    if {condition}: return parse_json_record(raw_line) is not None")
+
+    if overall_match_type == 'AND' and not json_ready:
+        source_lines.append("    return parse_json_record(raw_line) is not None")
+    else:
+        source_lines.append(f"    return {overall_match_type == 'AND'}")
+
+    exec(compile('\n'.join(source_lines) + '\n', '<filter criteria>', 'exec'), namespace)
+    return namespace['match_record']
+
 def process_file_chunk(args_tuple):
     """
-    Processes a specific byte range (chunk) of a file.
-    OPTIMIZATION: Returns raw strings (line_stripped) instead of dict objects.
+    Processes a specific byte range (chunk) of the worker's memory-mapped source file, using the
+    prefilter and record matcher init_worker built from the filter criteria.
+    OPTIMIZATION: Matching lines are streamed to the chunk's own part file instead of being held in
+    memory and pickled back to the parent; only the part path and counts cross the process boundary.
     """
-    filepath, start_byte, end_byte, filter_criteria, overall_match_type = args_tuple
+    start_byte, end_byte, part_path = args_tuple
     
-    matching_lines = [] 
+    match_count = 0
     lines_parsed = 0
+    line_prefilter = _worker_line_prefilter
+    match_record = _worker_match_record
     
-    with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
-        f.seek(start_byte)
-        
+    # Scan the worker's shared memory map with C-level newline searches; byte offsets come
+    # straight from the map, with no per-line UTF-8 re-encoding to track the position.
+    mm = _worker_source_mmap
+    advise_sequential_read(mm, start_byte, end_byte)
+    with open(part_path, 'wb', buffering=4 * 1024 * 1024) as part_file:
+        # mmap.readline finds the newline and copies the line out in a single C call
+        mm.seek(start_byte)
+        read_line = mm.readline
         current_byte = start_byte
-        for line in f:
+        while current_byte < end_byte:
+            raw_line = read_line()
+            current_byte += len(raw_line)
             lines_parsed += 1
-            line_stripped = line.strip()
-            current_byte += len(line.encode('utf-8'))
-            
-            if not line_stripped:
-                if current_byte >= end_byte:
-                    break
+
+            # Cheap literal scan first: skip decoding and parsing lines that cannot match
+            raw_line_lower = None
+            if line_prefilter is not None:
+                raw_line_lower = raw_line.lower()
+                # Only an ASCII line without \u escapes shows its values verbatim, so only such a line can be
+                # rejected here; the rest (escapes, non-ASCII case folding, invalid UTF-8) go to the matcher
+                if (not line_passes_prefilter(raw_line_lower, line_prefilter)
+                        and raw_line.isascii() and b'\\u' not in raw_line):
+                    continue
+
+            # ASCII lines (the norm: JSON escapes non-ASCII) stay bytes end to end and are written
+            # back as-is; only other lines are decoded, dropping invalid UTF-8 as before.
+            if raw_line.isascii():
+                output_line = raw_line.strip(ASCII_WHITESPACE_BYTES)
+                line_stripped = None
+            else:
+                line_stripped = raw_line.decode('utf-8', errors='ignore').strip()
+                output_line = line_stripped.encode('utf-8')
+        
+            if not output_line:
                 continue
-            
+        
             try:
-                # We still parse to check logic, but we won't store the result
-                json_obj = json.loads(line_stripped)
-                
-                # Evaluate each filter criterion
-                criterion_results = [] 
-                for criterion in filter_criteria:
-                    key_name = criterion['key']
-                    kws = criterion['keywords']
-                    match_type_keywords = criterion['match_type_keywords']
-
-                    flattened_obj = flatten_json(json_obj)
-                    
-                    source_value_raw = None 
-                    source_key_found = False
-                    
-                    # --- Determine Source Value ---
-                    if key_name and key_name.startswith('tunnels_'):
-                        sub_key = key_name.split('_', 1)[1]
-                        relevant_keys = [k for k in flattened_obj.keys() if k.startswith('tunnels_') and k.endswith(f'_{sub_key}')]
-                        
-                        if relevant_keys:
-                            source_key_found = True
-                            source_values = [str(flattened_obj[k]) for k in relevant_keys if k in flattened_obj and str(flattened_obj[k]).strip().lower() not in ('none', 'null')]
-                            source_value_raw = ','.join(source_values)
-                        
-                    elif key_name:
-                        if key_name in flattened_obj:
-                            source_key_found = True
-                            value = flattened_obj.get(key_name)
-                            if value is not None:
-                                str_value = str(value).strip().lower()
-                                if str_value not in ('none', 'null'):
-                                    source_value_raw = str_value
-                        
-                    else: # General search
-                        source_key_found = True
-                        source_value_raw = line_stripped.lower()
+                if not match_record(raw_line, raw_line_lower, line_stripped):
+                    continue
+            except Exception:
+                # Malformed JSON (or a non-object line) never matches
+                continue
 
-                    # --- Evaluate Keywords ---
-                    current_kws_match_status = True if match_type_keywords == 'AND' else False
-                    
-                    for kw in kws:
-                        individual_match = False
-                        
-                        # Handle Negation Logic (!)
-                        is_negation = False
-                        clean_kw = kw
-                        
-                        if kw.startswith('!') and kw != '!=empty':
-                            is_negation = True
-                            clean_kw = kw[1:]
-
-                        # 1. Special case: EMPTY / NOT EMPTY
-                        if clean_kw == '=empty':
-                            if not source_value_raw or not source_value_raw.strip():
-                                individual_match = True
-                        elif clean_kw == '!=empty':
-                            if source_value_raw and source_value_raw.strip():
-                                individual_match = True
-                        
-                        # 2. Standard substring/numerical filtering
-                        elif source_value_raw:
-                            val_str = str(source_value_raw).lower()
-                            
-                            # Numerical Check
-                            num_match = re.match(r'([<>]?=?)\s*(\-?\d+(\.\d+)?)$', clean_kw, re.IGNORECASE)
-                            
-                            if num_match:
-                                operator = num_match.group(1)
-                                target_num_str = num_match.group(2)
-                                try:
-                                    target_num = float(target_num_str)
-                                    actual_num = float(val_str)
-                                    
-                                    if operator == '>' and actual_num > target_num: individual_match = True
-                                    elif operator == '<' and actual_num < target_num: individual_match = True
-                                    elif operator == '>=' and actual_num >= target_num: individual_match = True
-                                    elif operator == '<=' and actual_num <= target_num: individual_match = True
-                                    elif (operator == '=' or operator == '') and actual_num == target_num: individual_match = True
-                                except ValueError:
-                                    pass 
-                            else:
-                                if clean_kw in val_str:
-                                    individual_match = True
-                        
-                        if is_negation:
-                            individual_match = not individual_match
-
-                        if match_type_keywords == 'AND':
-                            if not individual_match:
-                                current_kws_match_status = False
-                                break
-                        elif match_type_keywords == 'OR':
-                            if individual_match:
-                                current_kws_match_status = True
-                                break
-                    
-                    criterion_results.append(current_kws_match_status)
+            part_file.write(output_line)
+            part_file.write(b'\n')
+            match_count += 1
 
-                final_match = False
-                if overall_match_type == 'AND':
-                    final_match = all(criterion_results)
-                elif overall_match_type == 'OR':
-                    final_match = any(criterion_results)
-                
-                if final_match:
-                    # OPTIMIZATION: Store the raw string, not the dict object
-                    matching_lines.append(line_stripped)
+    return part_path, match_count, lines_parsed
 
-            except json.JSONDecodeError:
-                pass 
-            except Exception:
-                pass
-            
-            if current_byte >= end_byte:
-                break
-    return matching_lines, lines_parsed
+def order_criteria_by_selectivity(filepath, filter_criteria, overall_match_type, num_lines=CRITERIA_ORDER_SAMPLE_LINES):
+    """
+    Returns filter_criteria reordered for evaluation: under AND the condition that matches the
+    fewest of the first num_lines lines comes first, under OR the one that matches the most, so
+    the matcher's short-circuit settles most lines at the first condition. The result is the same
+    in any order; ties keep the entered order.
+    """
+    if len(filter_criteria) < 2 or num_lines <= 0:
+        return list(filter_criteria)
+    matchers = [build_record_matcher(prepare_filter_criteria([criterion]), 'AND') for criterion in filter_criteria]
+    hit_counts = [0] * len(filter_criteria)
+    try:
+        with open(filepath, 'rb') as f_sample:
+            for raw_line in itertools.islice(f_sample, num_lines):
+                line_stripped = None if raw_line.isascii() else raw_line.decode('utf-8', errors='ignore').strip()
+                for i, match_record in enumerate(matchers):
+                    try:
+                        if match_record(raw_line, None, line_stripped):
+                            hit_counts[i] += 1
+                    except Exception:
+                        pass
+    except OSError as e:
+        print(f"Error sampling '{filepath}' to order filter conditions: {e}", file=sys.stderr)
+        return list(filter_criteria)
+    order = sorted(range(len(filter_criteria)), key=hit_counts.__getitem__, reverse=(overall_match_type == 'OR'))
+    return [filter_criteria[i] for i in order]
+
+class DownloadProgressReader:
+    """
+    File-like wrapper around a streaming HTTP response body that counts the bytes pulled through it
+    and prints download progress at most every 5 seconds. Lets a decompressor read straight from the
+    network while the user still sees how far the download has got.
+    """
+    def __init__(self, raw_stream, total_size):
+        self.raw_stream = raw_stream
+        self.total_size = total_size
+        self.downloaded_size = 0
+        self.start_time = time.time()
+        self.last_update_time = self.start_time
+        self.lock = threading.Lock()
+
+    def read(self, size=-1):
+        chunk = self.raw_stream.read(size)
+        self.update(len(chunk))
+        return chunk
+
+    def update(self, num_bytes):
+        """Counts num_bytes as downloaded. Thread-safe, so parallel range downloads can share one reader."""
+        with self.lock:
+            self.downloaded_size += num_bytes
+            current_time = time.time()
+            if current_time - self.last_update_time >= 5:
+                percentage = (self.downloaded_size / self.total_size) * 100 if self.total_size else 0
+                elapsed_time = current_time - self.start_time
+                rate = (self.downloaded_size / (1024 * 1024)) / elapsed_time if elapsed_time else 0
+                sys.stdout.write(f"\rDownloading... {percentage:.2f}% ({self.downloaded_size / (1024 * 1024):.2f} MB / {self.total_size / (1024 * 1024):.2f} MB) at {rate:.2f} MB/s")
+                sys.stdout.flush()
+                self.last_update_time = current_time
 
 def download_and_decompress_gz_to_file(url, token, output_path):
-    """Downloads and decompresses a .gz file."""
+    """
+    Downloads a .gz file and decompresses it on the fly. The response body is streamed straight
+    into the gzip decompressor, so only the decompressed file is ever written to disk.
+    """
     headers = {"Token": token}
+    decompressed_file_path = os.path.splitext(output_path)[0]
+    if not decompressed_file_path.lower().endswith('.json'):
+        decompressed_file_path += '.json'
+    output_started = False
+
     try:
         print(f"Downloading from: {url}")
         response = requests.get(url, headers=headers, stream=True)
         response.raise_for_status()
+        # Undo any transport-level Content-Encoding so the reader yields the .gz file bytes themselves
+        response.raw.decode_content = True
 
         total_size = int(response.headers.get('content-length', 0))
-        downloaded_size = 0
-        start_time = time.time()
-        last_update_time = start_time
+        progress_reader = DownloadProgressReader(response.raw, total_size)
 
-        with open(output_path, 'wb') as outfile:
-            for chunk in response.iter_content(chunk_size=8192):
-                outfile.write(chunk)
-                downloaded_size += len(chunk)
-                current_time = time.time()
-                if current_time - last_update_time >= 5:
-                    percentage = (downloaded_size / total_size) * 100 if total_size else 0
-                    elapsed_time = current_time - start_time
-                    rate = (downloaded_size / (1024 * 1024)) / elapsed_time if elapsed_time else 0
-                    sys.stdout.write(f"\rDownloading... {percentage:.2f}% ({downloaded_size / (1024 * 1024):.2f} MB / {total_size / (1024 * 1024):.2f} MB) at {rate:.2f} MB/s")
-                    sys.stdout.flush()
-                    last_update_time = current_time
-            sys.stdout.write("\n")
-            sys.stdout.flush()
-            
-        print(f"Successfully downloaded gzipped file to: {output_path}")
+        print(f"Decompressing to {decompressed_file_path} while downloading...")
 
-        decompressed_file_path = os.path.splitext(output_path)[0]
-        if not decompressed_file_path.lower().endswith('.json'):
-            decompressed_file_path += '.json'
-
-        print(f"Decompressing {output_path} to {decompressed_file_path}...")
-        
-        with gzip.open(output_path, 'rb') as f_in:
+        # ISA-L's SIMD inflate is a drop-in replacement for the stdlib gzip module when installed
+        gzip_file_class = igzip.GzipFile if _ISAL_AVAILABLE else gzip.GzipFile
+        with gzip_file_class(fileobj=progress_reader, mode='rb') as f_in:
+            output_started = True
             with open(decompressed_file_path, 'wb') as f_out:
-                buffer_size = 1024 * 1024 
-                while True:
-                    chunk = f_in.read(buffer_size)
-                    if not chunk:
-                        break
-                    f_out.write(chunk)
-        
-        print(f"Successfully decompressed to {decompressed_file_path}")
-        
-        try:
-            os.remove(output_path)
-            print(f"Deleted temporary gzipped file: {output_path}")
-        except OSError as e:
-            print(f"Error deleting gzipped file {output_path}: {e}", file=sys.stderr)
+                shutil.copyfileobj(f_in, f_out, 1024 * 1024)
+        sys.stdout.write("\n")
+        sys.stdout.flush()
 
+        print(f"Successfully downloaded and decompressed to {decompressed_file_path}")
         return decompressed_file_path
     except Exception as e:
-        print(f"Error during download/decompression: {e}", file=sys.stderr)
+        print(f"\nError during download/decompression: {e}", file=sys.stderr)
+        if output_started and os.path.exists(decompressed_file_path):
+            try:
+                os.remove(decompressed_file_path)
+            except OSError as remove_error:
+                print(f"Error deleting partial file {decompressed_file_path}: {remove_error}", file=sys.stderr)
         return None
 
+def download_byte_range(url, headers, output_fd, start_byte, end_byte, progress_reader):
+    """Downloads bytes start_byte..end_byte (inclusive) of url and writes them at the same offsets of output_fd."""
+    range_headers = dict(headers, Range=f"bytes={start_byte}-{end_byte}")
+    with requests.get(url, headers=range_headers, stream=True) as response:
+        response.raise_for_status()
+        if response.status_code != 206:
+            raise IOError(f"Server ignored the range request for bytes {start_byte}-{end_byte}")
+        offset = start_byte
+        for chunk in response.iter_content(chunk_size=1024 * 1024):
+            view = memoryview(chunk)
+            while view:
+                written = os.pwrite(output_fd, view, offset)
+                view = view[written:]
+                offset += written
+            progress_reader.update(len(chunk))
+    if offset != end_byte + 1:
+        raise IOError(f"Incomplete range download: got bytes {start_byte}-{offset - 1} of {start_byte}-{end_byte}")
+
+def download_file_in_ranges(url, headers, output_path, total_size, num_connections):
+    """
+    Downloads url over num_connections parallel ranged GETs, each writing its slice straight into
+    a pre-sized output file with os.pwrite. Keeps several TCP connections busy at once, which fills
+    a fast link much better than a single stream.
+    """
+    range_size = -(-total_size // num_connections)
+    progress_reader = DownloadProgressReader(None, total_size)
+    output_fd = os.open(output_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        os.ftruncate(output_fd, total_size)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=num_connections) as executor:
+            futures = [
+                executor.submit(download_byte_range, url, headers, output_fd, start_byte,
+                                min(start_byte + range_size, total_size) - 1, progress_reader)
+                for start_byte in range(0, total_size, range_size)
+            ]
+            for future in concurrent.futures.as_completed(futures):
+                future.result()
+    finally:
+        os.close(output_fd)
+    sys.stdout.write("\n")
+    sys.stdout.flush()
+
 def download_raw_file_to_disk(url, token, output_path):
-    """Downloads a raw file."""
+    """
+    Downloads a raw file. Large files from servers that accept byte ranges are fetched over
+    PARALLEL_DOWNLOAD_CONNECTIONS connections; everything else is streamed over one.
+    """
     headers = {"Token": token}
+    output_started = False
     try:
         print(f"Downloading raw file from: {url}")
-        response = requests.get(url, headers=headers, stream=True)
-        response.raise_for_status()
+        # Probe the size and range support with a HEAD request; servers that reject HEAD are probed
+        # with the streaming GET instead, which is then reused for a single-stream download
+        response = requests.head(url, headers=headers, allow_redirects=True)
+        if not response.ok:
+            response = requests.get(url, headers=headers, stream=True)
+            response.raise_for_status()
 
         total_size = int(response.headers.get('content-length', 0))
-        downloaded_size = 0
-        start_time = time.time()
-        last_update_time = start_time
+        supports_ranges = response.headers.get('accept-ranges', '').lower() == 'bytes'
+        is_encoded = response.headers.get('content-encoding', 'identity').lower() != 'identity'
+        if (PARALLEL_DOWNLOAD_CONNECTIONS > 1 and supports_ranges and not is_encoded
+                and total_size >= PARALLEL_DOWNLOAD_MIN_SIZE and hasattr(os, 'pwrite')):
+            # Ranges are requested from the final (post-redirect) URL
+            download_url = response.url
+            response.close()
+            print(f"Using {PARALLEL_DOWNLOAD_CONNECTIONS} parallel connections...")
+            output_started = True
+            download_file_in_ranges(download_url, headers, output_path, total_size, PARALLEL_DOWNLOAD_CONNECTIONS)
+            print(f"Successfully downloaded raw file to: {output_path}")
+            return output_path
+
+        if response.request.method == 'HEAD':
+            response = requests.get(url, headers=headers, stream=True)
+            response.raise_for_status()
+            total_size = int(response.headers.get('content-length', 0))
 
+        # Let urllib3 undo any transport-level Content-Encoding, as iter_content would
+        response.raw.decode_content = True
+        progress_reader = DownloadProgressReader(response.raw, total_size)
+        output_started = True
         with open(output_path, 'wb') as outfile:
-            for chunk in response.iter_content(chunk_size=8192):
-                outfile.write(chunk)
-                downloaded_size += len(chunk)
-                current_time = time.time()
-                if current_time - last_update_time >= 5:
-                    percentage = (downloaded_size / total_size) * 100 if total_size else 0
-                    elapsed_time = current_time - start_time
-                    rate = (downloaded_size / (1024 * 1024)) / elapsed_time if elapsed_time else 0
-                    sys.stdout.write(f"\rDownloading... {percentage:.2f}% ({downloaded_size / (1024 * 1024):.2f} MB / {total_size / (1024 * 1024):.2f} MB) at {rate:.2f} MB/s")
-                    sys.stdout.flush()
-                    last_update_time = current_time
-            sys.stdout.write("\n")
-            sys.stdout.flush()
+            shutil.copyfileobj(progress_reader, outfile, 1024 * 1024)
+        sys.stdout.write("\n")
+        sys.stdout.flush()
 
         print(f"Successfully downloaded raw file to: {output_path}")
         return output_path
     except Exception as e:
         print(f"Error during raw file download: {e}", file=sys.stderr)
+        if output_started and os.path.exists(output_path):
+            try:
+                os.remove(output_path)
+            except OSError as remove_error:
+                print(f"Error deleting partial file {output_path}: {remove_error}", file=sys.stderr)
         return None
 
+def move_file(src_path, dest_path):
+    """
+    Moves a file with a single rename when source and destination share a filesystem, falling back
+    to shutil.move (copy + delete) when they don't, e.g. across mounts (EXDEV) or onto a directory.
+    """
+    try:
+        os.replace(src_path, dest_path)
+    except OSError:
+        shutil.move(src_path, dest_path)
+
+def get_pool_context():
+    """
+    Returns the multiprocessing context for the worker pools. On Linux this is 'fork', so workers
+    start as copies of the parent with every module already imported (Python 3.14 makes
+    'forkserver' the default there); other platforms keep their default, as fork is unsafe on macOS.
+    """
+    if sys.platform.startswith('linux'):
+        return multiprocessing.get_context('fork')
+    return multiprocessing.get_context()
+
+def get_available_cpu_count():
+    """
+    Returns the number of CPUs this process may actually run on. Unlike os.cpu_count(), this honours
+    CPU affinity masks (taskset, cgroup cpusets in containers), so the pool is not oversubscribed.
+    """
+    if hasattr(os, 'process_cpu_count'): # Python 3.13+
+        cpu_count = os.process_cpu_count()
+    elif hasattr(os, 'sched_getaffinity'):
+        cpu_count = len(os.sched_getaffinity(0))
+    else:
+        cpu_count = os.cpu_count()
+    return cpu_count if cpu_count else 4
+
+def is_same_file(path, source_abs_path):
+    """
+    Returns True if path names the source file, either by the same absolute path or, when both exist,
+    through a symlink or hard link to it (os.path.samefile).
+    """
+    if os.path.abspath(path) == source_abs_path:
+        return True
+    try:
+        return os.path.samefile(path, source_abs_path)
+    except OSError:
+        return False
+
 def print_keyword_tips():
     """Prints helpful tips for keyword entry."""
     print("\n  --- KEYWORD SEARCH TIPS ---")
@@ -348,14 +1067,81 @@ def print_keyword_tips():
     print("  2. Negation:    Prefix with '!' to exclude a term (e.g., '!clean').")
     print("  3. Existence:   Use '=EMPTY' to find missing values, '!=EMPTY' for existing values.")
     print("  4. Numerical:   Use operators for numbers (e.g., '>50', '<=100', '=443').")
-    print("  5. Combined:    Separate multiple keywords with commas (e.g., '>50, !clean, !=EMPTY').")
+    print("  5. Exact Match: Prefix with '==' to match the whole value only (e.g., '==us', not 'russia').")
+    print("  6. Combined:    Separate multiple keywords with commas (e.g., '>50, !clean, !=EMPTY').")
     print("  ---------------------------")
 
+def load_filter_config(config_path):
+    """
+    Loads a headless run from a JSON config file, exiting with an error if it is invalid:
+        {"input_file": "20240610AnonRes.json",
+         "filters": [{"key": "location_country", "keywords": ["us", "de"], "match_type": "OR"},
+                     {"keywords": "!callback"}],
+         "match_type": "AND", "output_file": "filtered.json"}
+    A filter without "key" is a general search. Keywords (a list or a comma-separated string) use the
+    interactive keyword syntax. Match types default to AND and output_file to the generated name.
+    """
+    try:
+        with open(config_path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Error reading config file '{config_path}': {e}", file=sys.stderr)
+        sys.exit(1)
+
+    def config_error(message):
+        print(f"Error in config file '{config_path}': {message}", file=sys.stderr)
+        sys.exit(1)
+
+    def get_match_type(settings, where):
+        match_type = str(settings.get('match_type', 'AND')).strip().upper()
+        if match_type not in ('AND', 'OR'):
+            config_error(f"{where} 'match_type' must be AND or OR.")
+        return match_type
+
+    if not isinstance(config, dict):
+        config_error("expected a JSON object.")
+    input_file = config.get('input_file')
+    if not isinstance(input_file, str) or not input_file.strip():
+        config_error("'input_file' is required.")
+    output_file = config.get('output_file') or ''
+    if not isinstance(output_file, str):
+        config_error("'output_file' must be a string.")
+    filters = config.get('filters')
+    if not isinstance(filters, list) or not filters:
+        config_error("'filters' must be a non-empty list.")
+
+    filter_criteria = []
+    for i, filter_settings in enumerate(filters, 1):
+        if not isinstance(filter_settings, dict):
+            config_error(f"filter {i} must be an object.")
+        key_name = filter_settings.get('key') or None
+        if key_name is not None and not isinstance(key_name, str):
+            config_error(f"filter {i} 'key' must be a string.")
+        keywords = filter_settings.get('keywords', [])
+        if isinstance(keywords, str):
+            keywords = keywords.split(',')
+        elif not isinstance(keywords, list):
+            config_error(f"filter {i} 'keywords' must be a list or a comma-separated string.")
+        keywords = [str(kw).strip().lower() for kw in keywords if str(kw).strip()]
+        if not keywords:
+            config_error(f"filter {i} has no keywords.")
+        filter_criteria.append(FilterSpec(key_name, tuple(keywords), get_match_type(filter_settings, f"filter {i}")))
+
+    return FilterConfig(input_file.strip(), filter_criteria, get_match_type(config, "top-level"), output_file.strip())
+
 # --- Main Script Logic ---
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Download, sample and filter Spur feeds. Runs interactively unless --config is given.")
+    parser.add_argument("-c", "--config", type=str, help="Path to a JSON config file with the input file and filters, to run without prompts.")
+    args = parser.parse_args()
+    filter_config = load_filter_config(args.config) if args.config else None
+
     script_start_time = time.time()
+    NUM_PARALLEL_PROCESSORS = get_available_cpu_count()
+    working_directory = os.getcwd() # The script never changes directory; output files are created here
 
-    if os.environ.get('TOKEN') is None:
+    # Config runs read a local file, so they never need a token
+    if os.environ.get('TOKEN') is None and filter_config is None:
         user_token = input("No TOKEN environment variable found. Please enter your Spur API token: ").strip()
         os.environ['TOKEN'] = user_token
         API_TOKEN = user_token
@@ -367,10 +1153,16 @@ if __name__ == "__main__":
         base_feed_name = "UnknownFeed" 
         is_feed_json = True 
         
-        use_existing_file_input = input("Do you want to use an existing Spur Feed file? (Y/N): ").strip().upper()
+        if filter_config is not None:
+            use_existing_file_input = 'Y'
+        else:
+            use_existing_file_input = input("Do you want to use an existing Spur Feed file? (Y/N): ").strip().upper()
 
         if use_existing_file_input == 'Y':
-            provided_file_path = input("Please enter the full path to your Spur Feed file: ").strip()
+            if filter_config is not None:
+                provided_file_path = filter_config.input_file
+            else:
+                provided_file_path = input("Please enter the full path to your Spur Feed file: ").strip()
             if not os.path.exists(provided_file_path):
                 print(f"Error: Provided input file '{provided_file_path}' not found. Exiting.", file=sys.stderr)
                 sys.exit(1)
@@ -378,7 +1170,7 @@ if __name__ == "__main__":
             decompressed_source_file_path = provided_file_path
             print(f"Using provided file: {decompressed_source_file_path}")
 
-            match = re.search(r'(\d{8})(\d{6})?(AnonRes|AnonResRT|Anonymous|IPGeoMMDB|IPGeoJSON|ServiceMetricsAll|DCH|AnonymousIPv6|AnonymousResidentialIPv6|AnonymousResidential|AnonymousResidentialRT|IPSummary|SimilarIPs|AIData)\.(json|mmdb|json\.gz)$', os.path.basename(provided_file_path), re.IGNORECASE)
+            match = FEED_FILENAME_PATTERN.search(os.path.basename(provided_file_path))
             if match:
                 current_date_ymd = match.group(1)
                 if match.group(2):
@@ -388,7 +1180,7 @@ if __name__ == "__main__":
                     is_feed_json = False
             else:
                 name_without_ext = os.path.splitext(os.path.basename(provided_file_path))[0]
-                base_feed_name_candidate = re.sub(r'^\d{8}(\d{6})?', '', name_without_ext)
+                base_feed_name_candidate = FEED_DATE_PREFIX_PATTERN.sub('', name_without_ext)
                 if base_feed_name_candidate:
                     base_feed_name = base_feed_name_candidate
                     if "AnonRes" in base_feed_name and "AnonResRT" not in base_feed_name:
@@ -602,9 +1394,15 @@ if __name__ == "__main__":
         sys.exit(1)
 
     filter_criteria = []
+    sample_value_cache = SampleValueCache(decompressed_source_file_path)
     
-    raw_filter_choice = input("\nDo you want to filter the data? (Y/N) [Default: Y]: ").strip().upper()
-    perform_initial_filter_choice = 'N' if raw_filter_choice == 'N' else 'Y'
+    if filter_config is not None:
+        # The filters come from the config file; skip key discovery and the filter prompts
+        filter_criteria = list(filter_config.filter_criteria)
+        perform_initial_filter_choice = 'N'
+    else:
+        raw_filter_choice = input("\nDo you want to filter the data? (Y/N) [Default: Y]: ").strip().upper()
+        perform_initial_filter_choice = 'N' if raw_filter_choice == 'N' else 'Y'
 
     if perform_initial_filter_choice == 'Y':
         while True:
@@ -616,42 +1414,25 @@ if __name__ == "__main__":
 
             if perform_key_specific_filter_choice == 'Y':
                 # New prompt for key sampling size
-                key_sample_size_str = input("  How many lines to sample for keys? (Default 500000): ").strip()
+                key_sample_size_str = input("  How many lines to sample for keys? (Default 500000, Q for a quick scan of the first 4 MiB): ").strip()
                 key_sample_size = 500000
+                quick_key_scan = key_sample_size_str.upper() == 'Q'
                 if key_sample_size_str.isdigit():
                     key_sample_size = int(key_sample_size_str)
                 
-                print(f"\n--- Analyzing first {key_sample_size} lines for filterable keys ---") 
-                sample_lines = []
-                try:
-                    with open(decompressed_source_file_path, 'r', encoding='utf-8') as f_sample:
-                        for _ in range(key_sample_size): 
-                            line = f_sample.readline()
-                            if not line: break
-                            sample_lines.append(line)
-                except Exception:
-                    sample_lines = []
-
-                suggested_keys = set()
-                flattened_keys = set()
-                for line in sample_lines:
-                    try:
-                        obj = json.loads(line.strip())
-                        temp_flattened = flatten_json(obj)
-                        flattened_keys.update(temp_flattened.keys())
-                        for key in temp_flattened.keys():
-                            match = re.match(r'(.+?)_\d+_(.+)', key)
-                            if match:
-                                suggested_keys.add(f"{match.group(1)}_{match.group(2)}")
-                            else:
-                                suggested_keys.add(key)
-                    except json.JSONDecodeError:
-                        pass
+                if quick_key_scan:
+                    print(f"\n--- Quick scan of the first {QUICK_KEY_SCAN_BYTES // (1024 * 1024)} MiB for filterable keys ---")
+                else:
+                    print(f"\n--- Sampling up to {key_sample_size} lines across the file for filterable keys ---")
+                flattened_keys, suggested_keys, key_lines_scanned = discover_feed_keys(
+                    decompressed_source_file_path, key_sample_size, NUM_PARALLEL_PROCESSORS, quick=quick_key_scan
+                )
+                flattened_keys_by_root = index_keys_by_root(flattened_keys)
+                print(f"  Sampled {key_lines_scanned} lines.")
                 
                 if suggested_keys:
                     print("\nAvailable keys for filtering:") 
-                    for key in sorted(list(suggested_keys)):
-                        print(f"  - {key}")
+                    print("\n".join(f"  - {key}" for key in sorted(suggested_keys)))
                     print("\n")
                 
                 current_filter_key = input("  Enter the exact key name for this filter: ").strip()
@@ -659,31 +1440,15 @@ if __name__ == "__main__":
 
                 see_sample_values = input(f"  See sample values for '{current_filter_key}'? (Y/N): ").strip().upper()
                 if see_sample_values == 'Y':
-                    # New prompt for value sampling size
-                    val_sample_size_str = input("  How many lines to sample for values? (Default 500000): ").strip()
-                    val_sample_size = 500000
-                    if val_sample_size_str.isdigit():
-                        val_sample_size = int(val_sample_size_str)
-
-                    print(f"\n--- Analyzing first {val_sample_size} lines for values ---")
-                    
-                    # Re-read file for value sampling (sample_lines might be too small or different)
-                    val_sample_lines = []
-                    try:
-                        with open(decompressed_source_file_path, 'r', encoding='utf-8') as f_sample:
-                            for _ in range(val_sample_size):
-                                line = f_sample.readline()
-                                if not line: break
-                                val_sample_lines.append(line)
-                    except Exception:
-                        val_sample_lines = []
-                        
+                    # Resolve the flattened keys first: if none match, there is nothing to sample
                     unique_values = set()
                     target_flattened_keys = []
-                    match = re.match(r'(.+?)_(.+)', current_filter_key)
+                    match = KEY_SPLIT_PATTERN.match(current_filter_key)
                     if match:
                         root_key, sub_key = match.groups()
-                        for f_key in flattened_keys:
+                        # Only keys under root_key can start with it (a root containing '_' needs the full scan)
+                        candidate_keys = flattened_keys_by_root.get(root_key, ()) if '_' not in root_key else flattened_keys
+                        for f_key in candidate_keys:
                             if f_key.startswith(f"{root_key}_") and f_key.endswith(f"_{sub_key}"):
                                 target_flattened_keys.append(f_key)
                     else:
@@ -691,24 +1456,25 @@ if __name__ == "__main__":
                             target_flattened_keys.append(current_filter_key)
                     
                     if target_flattened_keys:
-                        for line in val_sample_lines:
-                            try:
-                                obj = json.loads(line.strip())
-                                flattened_obj = flatten_json(obj)
-                                for f_key in target_flattened_keys:
-                                    value = flattened_obj.get(f_key)
-                                    if value is not None:
-                                        if isinstance(value, str):
-                                            for individual_value in value.split(','):
-                                                unique_values.add(individual_value.strip())
-                                        else:
-                                            unique_values.add(str(value).strip())
-                            except json.JSONDecodeError: pass
+                        # New prompt for value sampling size
+                        val_sample_size_str = input("  How many lines to sample for values? (Default 500000): ").strip()
+                        val_sample_size = 500000
+                        if val_sample_size_str.isdigit():
+                            val_sample_size = int(val_sample_size_str)
+
+                        print(f"\n--- Analyzing first {val_sample_size} lines for values ---")
+                        
+                        # Served from memory after the first prompt (the key scan samples chunks across the whole file)
+                        try:
+                            unique_values = sample_value_cache.get_values(target_flattened_keys, val_sample_size)
+                        except Exception:
+                            unique_values = set()
+                    else:
+                        print(f"\n  '{current_filter_key}' was not among the sampled keys; skipping value sampling.")
 
                     if unique_values:
                         print("Unique values found:")
-                        for value in sorted(list(unique_values)):
-                            print(f"  - {value}")
+                        print("\n".join(f"  - {value}" for value in sorted(unique_values)))
                         print("\n")
                     else:
                         print("No values found in sample.\n")
@@ -736,22 +1502,25 @@ if __name__ == "__main__":
                         if match_type_kws_choice in ['AND', 'OR']:
                             current_match_type_keywords = match_type_kws_choice
                     
-                    filter_criteria.append({
-                        'key': current_filter_key,
-                        'keywords': current_keywords,
-                        'match_type_keywords': current_match_type_keywords
-                    })
+                    filter_criteria.append(FilterSpec(current_filter_key, tuple(current_keywords), current_match_type_keywords))
                     print(f"  Added filter.")
             
             if input("Add another filter condition (Y/N)? ").strip().upper() != 'Y':
                 break
     
+    # Sampled values are only needed while setting up filters; release them before processing
+    sample_value_cache = None
+    
     overall_match_type = 'AND'
-    if len(filter_criteria) > 1:
+    if filter_config is not None:
+        overall_match_type = filter_config.match_type
+    elif len(filter_criteria) > 1:
         overall_match_type_choice = input("Apply ALL filter conditions (AND) or ANY filter condition (OR)? (AND/OR): ").strip().upper()
         if overall_match_type_choice in ['AND', 'OR']:
             overall_match_type = overall_match_type_choice
 
+    source_abs_path = os.path.abspath(decompressed_source_file_path)
+
     if not filter_criteria:
         # --- NO FILTERING: BYPASS PROCESSING ---
         
@@ -767,8 +1536,8 @@ if __name__ == "__main__":
                 current_date_ymd, current_time_hms, base_feed_name, user_output_filename, [], overall_match_type
             )
             # Ensure we don't overwrite if they just typed the same name
-            if os.path.abspath(final_output_path) != os.path.abspath(decompressed_source_file_path):
-                shutil.move(decompressed_source_file_path, final_output_path)
+            if not is_same_file(final_output_path, source_abs_path):
+                move_file(decompressed_source_file_path, final_output_path)
                 print(f"File moved to: {final_output_path}")
             else:
                 print(f"File available at: {final_output_path}")
@@ -788,20 +1557,26 @@ if __name__ == "__main__":
         overall_match_type
     )
 
-    user_output_filename = input(f"Enter output filename (Default: {default_generated_filename}): ").strip()
+    if filter_config is not None:
+        user_output_filename = filter_config.output_file
+    else:
+        user_output_filename = input(f"Enter output filename (Default: {default_generated_filename}): ").strip()
     
-    filtered_output_filename = get_output_filename(
-        current_date_ymd, 
-        current_time_hms, 
-        base_feed_name,
-        user_output_filename,    
-        filter_criteria if perform_filter == 'Y' else [],
-        overall_match_type
-    )
-    output_file_path = os.path.join(os.getcwd(), filtered_output_filename)
+    if user_output_filename:
+        filtered_output_filename = get_output_filename(
+            current_date_ymd, 
+            current_time_hms, 
+            base_feed_name,
+            user_output_filename,    
+            filter_criteria if perform_filter == 'Y' else [],
+            overall_match_type
+        )
+    else:
+        filtered_output_filename = default_generated_filename
+    output_file_path = os.path.join(working_directory, filtered_output_filename)
 
     # --- CRITICAL SAFEGUARD: Prevent overwriting source file ---
-    if os.path.abspath(output_file_path) == os.path.abspath(decompressed_source_file_path):
+    if is_same_file(output_file_path, source_abs_path):
         print("Warning: Output filename matches source filename. Prepending 'Filtered_' to prevent data loss.")
         dirname, basename = os.path.split(output_file_path)
         output_file_path = os.path.join(dirname, "Filtered_" + basename)
@@ -813,51 +1588,63 @@ if __name__ == "__main__":
     records_exported_count = 0
     total_records_parsed = 0
     chunks_completed = 0
-    start_time = time.time()
+    # Monotonic clock: the throttle and the speed readout are immune to wall-clock adjustments
+    start_time = time.monotonic()
     last_ui_update_time = start_time  # <-- Added a dedicated UI timer
     
-    NUM_PARALLEL_PROCESSORS = os.cpu_count() if os.cpu_count() else 4
-
     try:
-        with open(output_file_path, 'w', encoding='utf-8') as outfile:
-            # 1. Get the chunks (Optimized for 64MB targets)
-            chunks = get_file_chunks(decompressed_source_file_path, NUM_PARALLEL_PROCESSORS)
-            total_chunks = len(chunks)
-            
-            # 2. Update Feedback: Show the user we are using safe chunking
-            print(f"Using {NUM_PARALLEL_PROCESSORS} parallel processors to process {total_chunks} data chunks (Optimized for Memory Safety).")
-            
-            with multiprocessing.Pool(processes=NUM_PARALLEL_PROCESSORS) as pool:
-                results_iterator = pool.imap_unordered(
-                    process_file_chunk,
-                    [(decompressed_source_file_path, start, end, filter_criteria, overall_match_type) for start, end in chunks]
-                )
+        # 1. Get the chunks (Optimized for 64MB targets)
+        chunks = get_file_chunks(decompressed_source_file_path, NUM_PARALLEL_PROCESSORS * FILTER_CHUNKS_PER_PROCESS)
+        # The output name keeps the entered order; only the workers see the reordered conditions
+        evaluation_criteria = order_criteria_by_selectivity(decompressed_source_file_path, filter_criteria, overall_match_type)
+        total_chunks = len(chunks)
+        # Each chunk's matches go to its own part file next to the output, joined in file order afterwards
+        part_paths = [f"{output_file_path}.part{i}" for i in range(total_chunks)]
+        
+        # 2. Update Feedback: Show the user we are using safe chunking
+        print(f"Using {NUM_PARALLEL_PROCESSORS} parallel processors to process {total_chunks} data chunks (Optimized for Memory Safety).")
+        
+        try:
+            with get_pool_context().Pool(
+                processes=NUM_PARALLEL_PROCESSORS,
+                initializer=init_worker,
+                initargs=(decompressed_source_file_path, tuple(evaluation_criteria), overall_match_type)
+            ) as pool:
+                # Tasks are generated lazily and handed out one chunk at a time until there are more
+                # chunks than FILTER_CHUNKS_PER_PROCESS per worker, then a few at a time to save IPC round-trips.
+                tasks = ((start, end, part_path) for (start, end), part_path in zip(chunks, part_paths))
+                task_chunksize = max(1, total_chunks // (NUM_PARALLEL_PROCESSORS * FILTER_CHUNKS_PER_PROCESS))
+                results_iterator = pool.imap_unordered(process_file_chunk, tasks, chunksize=task_chunksize)
                 
-                for matching_lines_in_chunk, lines_parsed_in_chunk in results_iterator:
+                for _, match_count_in_chunk, lines_parsed_in_chunk in results_iterator:
                     chunks_completed += 1
                     total_records_parsed += lines_parsed_in_chunk
-                    try: 
-                        # Write raw strings directly (Memory Efficient)
-                        for line in matching_lines_in_chunk:
-                            outfile.write(line + '\n')
-                            records_exported_count += 1
-                        
-                        # 3. TIME-BASED UI THROTTLING (Max 2 updates per second)
-                        current_time = time.time()
-                        if current_time - last_ui_update_time >= 0.5 or chunks_completed == total_chunks:
-                            elapsed_time = current_time - start_time
-                            records_per_second = total_records_parsed / elapsed_time if elapsed_time > 0 else 0
-                            progress_pct = (chunks_completed / total_chunks) * 100
-                            sys.stdout.write(f"\r  Progress: {progress_pct:.1f}% ({chunks_completed}/{total_chunks} chunks) | Exported: {records_exported_count} records | Speed: {records_per_second:.2f} parsed/s")
-                            sys.stdout.flush()
-                            last_ui_update_time = current_time  # Reset the UI timer
-
-                    except Exception as exc:
-                        print(f"\nError processing chunk: {exc}", file=sys.stderr)
+                    records_exported_count += match_count_in_chunk
+                    
+                    # 3. TIME-BASED UI THROTTLING (Max 2 updates per second)
+                    current_time = time.monotonic()
+                    if current_time - last_ui_update_time >= 0.5 or chunks_completed == total_chunks:
+                        elapsed_time = current_time - start_time
+                        records_per_second = total_records_parsed / elapsed_time if elapsed_time > 0 else 0
+                        progress_pct = (chunks_completed / total_chunks) * 100
+                        sys.stdout.write(f"\r  Progress: {progress_pct:.1f}% ({chunks_completed}/{total_chunks} chunks) | Exported: {records_exported_count} records | Speed: {records_per_second:.2f} parsed/s")
+                        sys.stdout.flush()
+                        last_ui_update_time = current_time  # Reset the UI timer
             
-            # Print a newline to ensure the final success message is on a new line
-            print()
-            print(f"Successfully exported {records_exported_count} records to {output_file_path}.")
+            # 4. Join the part files in chunk order (the output keeps the source file's line order)
+            with open(output_file_path, 'wb') as outfile:
+                for part_path in part_paths:
+                    with open(part_path, 'rb') as part_file:
+                        shutil.copyfileobj(part_file, outfile, 4 * 1024 * 1024)
+                    os.remove(part_path)
+        finally:
+            for part_path in part_paths:
+                if os.path.exists(part_path):
+                    os.remove(part_path)
+        
+        # Print a newline to ensure the final success message is on a new line
+        print()
+        print(f"Successfully exported {records_exported_count} records to {output_file_path}.")
 
     except Exception as e:
         print(f"\nError during export: {e}", file=sys.stderr)
@@ -0,0 +1,74 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import spurfeedmultifilter as sfm
+
+
+def run_filter(tmp_path, lines, filter_criteria, overall_match_type='AND'):
+    """Filters the given raw lines through one worker chunk and returns the exported lines."""
+    source_path = tmp_path / "feed.json"
+    source_path.write_bytes(b"".join(line + b"\n" for line in lines))
+    part_path = str(tmp_path / "feed.part")
+    sfm.init_worker(str(source_path), tuple(filter_criteria), overall_match_type)
+    for start_byte, end_byte in sfm.get_file_chunks(str(source_path), 1):
+        sfm.process_file_chunk((start_byte, end_byte, part_path))
+    with open(part_path, 'rb') as part_file:
+        return part_file.read().splitlines()
+
+
+def test_escaped_slash_matches_keyword_with_slash(tmp_path):
+    line = b'{"as":{"organization":"a\\/b Networks"}}'
+    criteria = [sfm.FilterSpec('as_organization', ('a/b',), 'AND')]
+    assert run_filter(tmp_path, [line, b'{"as":{"organization":"other"}}'], criteria) == [line]
+
+
+def test_slash_is_not_a_prefilter_literal():
+    assert not sfm.is_prefilter_safe_literal('a/b')
+    assert sfm.is_prefilter_safe_literal('nord-vpn')
+
+
+@pytest.mark.parametrize("line, keyword", [
+    (b'{"org":"\\u0041BC"}', 'abc'),
+    (b'{"org":"TURK BIL\\u0130"}', 'bili'),
+    (b'{"org":"\\u212aelvin"}', 'kelvin'),
+    ('{"org":"TURK BIL\u0130"}'.encode('utf-8'), 'bili'),
+    ('{"org":"\u212aelvin"}'.encode('utf-8'), 'kelvin'),
+])
+def test_prefilter_keeps_lines_whose_values_differ_from_raw_bytes(tmp_path, line, keyword):
+    criteria = [sfm.FilterSpec('org', (keyword,), 'AND')]
+    assert run_filter(tmp_path, [line, b'{"org":"other"}'], criteria) == [line]
+
+
+def test_general_search_only_exports_json_objects(tmp_path):
+    lines = [b'not json nordv', b'["nordv"]', b'{"truncated": "nordv', b'{"name": "nordvpn"}']
+    for overall_match_type in ('AND', 'OR'):
+        criteria = [sfm.FilterSpec(None, ('nordv',), 'OR'), sfm.FilterSpec(None, ('name',), 'OR')]
+        assert run_filter(tmp_path, lines, criteria, overall_match_type) == [b'{"name": "nordvpn"}']
+
+
+def test_flatten_json_keeps_depth_first_order_and_last_write():
+    record = {"a_b": 1, "a": {"b": 2, "c": {"d": 3}}, "e": [{"f": 4}, 5], "g": [1, "x"]}
+    flattened = sfm.flatten_json(record)
+    assert list(flattened.items()) == [("a_b", 2), ("a_c_d", 3), ("e_0_f", 4), ("e_1", 5), ("g", "1,x")]
+    assert sfm.get_flat_value(record, "a_b") == 2
+    assert sfm.get_flat_value(record, "e_0_f") == 4
+
+
+def test_config_rejects_non_string_output_file(tmp_path):
+    config_path = tmp_path / "filters.json"
+    config_path.write_text(json.dumps({"input_file": "feed.json", "output_file": 5, "filters": [{"keywords": "nord"}]}))
+    with pytest.raises(SystemExit):
+        sfm.load_filter_config(str(config_path))
+
+
+def test_invalid_utf8_and_wide_integers_parse_like_stdlib(tmp_path):
+    lines = [b'{"organization":"bad\xffbyte","asn":1}', b'{"organization":"x","asn":100000000000000000000}']
+    criteria = [sfm.FilterSpec('organization', ('badbyte',), 'OR')]
+    assert run_filter(tmp_path, lines, criteria) == [b'{"organization":"badbyte","asn":1}']
+    assert sfm.json_loads(lines[0]) == {"organization": "badbyte", "asn": 1}
+    assert sfm.json_loads(lines[1])["asn"] == 100000000000000000000